@@ -0,0 +1,59 @@
+'''
+Measures commit throughput with several processes committing
+into the same repository, and checks that no commit was lost.
+Usage: python benchmarks/concurrent_commits.py [processes] [commits per process]
+Set MGIT_FSYNC=1 to include the cost of flushing objects and refs.
+'''
+import os
+import sys
+import time
+import tempfile
+from multiprocessing import Process
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "mgit"))
+
+import base
+import data
+
+
+def committer(worker, commits):
+    for i in range(commits):
+        while True:
+            try:
+                base.commit(f"worker {worker} commit {i}")
+                break
+            except (data.StaleRefError, FileExistsError):
+                # Another worker moved the branch or holds its lock
+                continue
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    commits = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        base.init()
+        for i in range(100):
+            with open(f"file{i}.txt", "w") as file:
+                file.write(f"{i}\n" * 100)
+
+        start = time.perf_counter()
+        workers = [Process(target=committer, args=(worker, commits))
+                   for worker in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        head = data.getRef("HEAD").value
+        found = sum(1 for _ in data.iterParentsAndCommits({head}))
+        total = processes * commits
+        print(f"{processes} processes, {total} commits in {elapsed:.3f}s "\
+              f"({total / elapsed:.1f} commits/s), fsync={'on' if data.FSYNC else 'off'}")
+        print(f"{found} commits reachable from HEAD, {total - found} lost")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+'''
+Compares scans of the working directory with and without
+a .mgitignore file pruning a large ignored directory.
+Usage: python benchmarks/ignore_scan.py [tracked files] [ignored files]
+'''
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "mgit"))
+
+import base
+import ignore
+
+
+def populate(tracked, ignored):
+    for i in range(tracked):
+        directory = os.path.join("src", f"pkg{i % 20}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{i}.py"), "w") as file:
+            file.write(f"value = {i}\n")
+
+    for i in range(ignored):
+        directory = os.path.join("node_modules", f"dep{i % 200}", "lib")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"index{i}.js"), "w") as file:
+            file.write(f"module.exports = {i}\n")
+
+
+def timeScan():
+    start = time.perf_counter()
+    files = len(base.getWorkingTree())
+    return files, time.perf_counter() - start
+
+
+def main():
+    tracked = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    ignored = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        base.init()
+        populate(tracked, ignored)
+
+        files, elapsed = timeScan()
+        print(f"without {ignore.IGNORE_FILE}: {files} files in {elapsed:.3f}s")
+
+        with open(ignore.IGNORE_FILE, "w") as file:
+            file.write("node_modules/\n*.pyc\n")
+
+        files, elapsed = timeScan()
+        print(f"with {ignore.IGNORE_FILE}:    {files} files in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
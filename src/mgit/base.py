@@ -1,15 +1,19 @@
 import data
 import os
+import time
 import textwrap
 import diff
+import ignore
+import workdir
+import reachable
 
 def init():
     '''
     This function is used to initialise a mgit repository.
     If the cwd is already a repository, an exception is raise.
     '''
-    data.init()
-    data.updateRef("HEAD", data.RefValue(symbolic=True, value=os.path.join(
+    repository = data.init()
+    repository.updateRef("HEAD", data.RefValue(symbolic=True, value=os.path.join(
         "ref", "heads", "master" 
     )))
 
@@ -26,9 +30,14 @@ def getBranchName():
     return os.path.relpath(HEAD.value, os.path.join("ref", "heads"))
 
 @data.mgit_required
-def commit(message):
+def commit(message, repository = None):
+    '''
+    Commits the working directory of the repository, by default
+    the current one.
+    '''
+    repository = repository or data.current()
     # check if HEAD is in detached state
-    HEAD = data.getRef("HEAD", deref=False)
+    HEAD = repository.getRef("HEAD", deref=False)
     detached = False
     if not HEAD.symbolic:
         print("HEAD is in a detached state.\n"\
@@ -38,49 +47,79 @@ def commit(message):
         detached = True
     
     # tree object-id
-    commitObject = f"tree {writeTree()}\n"
+    tree = writeTree(repository=repository)
     
     if detached:
-        parent = data.getRef("HEAD", deref=False).value
+        parent = repository.getRef("HEAD", deref=False).value
     # Get the object-id pointed to by the branch
     else:
-        parent = data.getRef(HEAD.value).value
+        parent = repository.getRef(HEAD.value).value
 
     mergeHead = None
     try:
-        mergeHead = data.getRef("MERGE_HEAD").value
+        mergeHead = repository.getRef("MERGE_HEAD").value
     except Exception:
         pass
 
     # parent commit hash
+    parents = []
     if parent:
-        commitObject += f"parent {parent}\n"
+        parents.append(parent)
     # If this is a merge, a merge head will be
     # present. Hence, write that as a parent too
     if mergeHead:
-        commitObject += f"parent {mergeHead}\n"
-        data.deleteRef("MERGE_HEAD", deref=False)
-    # leaving a line between the metadata('tree' object-id) and the commit message
-    commitObject += "\n"
-
-    commitObject += message
+        parents.append(mergeHead)
 
-    objectId = data.hashObject(commitObject.encode(), "commit")
+    objectId = writeCommit(tree, parents, message, repository=repository)
     refValue = data.RefValue(symbolic=False, value=objectId)
     # If HEAD is detached, just update HEAD
+    # The update fails if another writer moved the branch since
+    # the parent was read, instead of silently dropping its commit
     if detached:
-        data.updateRef("HEAD", refValue)
+        repository.updateRef("HEAD", refValue, expected=parent)
     # If HEAD points to a branch, update the branch
     else:
-        data.updateRef(HEAD.value, refValue, deref=False)
+        repository.updateRef(HEAD.value, refValue, deref=False, expected=parent)
+    # The merge is only concluded once its commit is recorded,
+    # a failed update leaves it in place to be retried
+    if mergeHead:
+        repository.deleteRef("MERGE_HEAD", deref=False)
     return objectId
 
 @data.mgit_required
-def writeTree(directory = "."):
+def writeCommit(tree, parents, message, repository = None):
+    '''
+    Writes a commit object for the given tree object-id, parent
+    commit object-ids and message, and returns its object-id.
+    By default, the commit is written to the current repository.
+    '''
+    repository = repository or data.current()
+    commitObject = f"tree {tree}\n"
+    for parent in parents:
+        commitObject += f"parent {parent}\n"
+    # leaving a line between the metadata('tree' object-id) and the commit message
+    commitObject += "\n"
+
+    commitObject += message
+
+    return repository.hashObject(commitObject.encode(), "commit")
+
+@data.mgit_required
+def writeTree(directory = None, repository = None):
     '''
     This function is used to write a tree(directory) to the object 
     database.
+    The objects of the whole tree are written as a single batch.
+    By default, the working directory of the current repository
+    is written.
     '''
+    repository = repository or data.current()
+    ignore.clearCache()
+    with repository.objectBatch():
+        return _writeTree(repository, directory or repository.path)
+
+
+def _writeTree(repository, directory):
     entries = []
     # Get the entries present in a directory
     directoryEntries = os.scandir(directory)
@@ -88,30 +127,23 @@ def writeTree(directory = "."):
     for entry in directoryEntries:
         # Get the full path of an entry
         fullPath = os.path.join(directory, entry.name)
-        if isIgnored(fullPath):
+        if isIgnored(fullPath, entry.is_dir(follow_symlinks=False), repository.path):
             continue
         if entry.is_file(follow_symlinks=False):
             type_ = "blob"
             name = entry.name
-            with open(fullPath, "rb") as file:
-                blob = file.read()
-
-            oid = data.hashObject(blob)
+            oid = repository.hashFile(fullPath)
 
             entries.append((type_, oid, name))
 
         elif entry.is_dir(follow_symlinks=False):
             type_ = "tree"
             name = entry.name
-            oid = writeTree(fullPath)
+            oid = _writeTree(repository, fullPath)
 
             entries.append((type_, oid, name))
 
-    tree = ""
-    for entry in entries:
-        tree += f"{entry[0]} {entry[1]} {entry[2]}\n"
-
-    return data.hashObject(tree.encode(), type_= "tree")
+    return repository.hashObject(data.encodeTree(entries), type_= "tree")
 
 
 @data.mgit_required
@@ -119,7 +151,8 @@ def readTree(objectId):
     if not os.path.exists(os.path.join(".mgit", "objects", objectId)):
         raise FileNotFoundError("No object found with given object-id.")
     _emptyDirectory()
-    _createTree(objectId, basePath = "")
+    directories, files = workdir.planTree(objectId)
+    workdir.checkout(directories, files, progress=workdir.reportProgress)
 
 
 def _iterTreeEntries(oid):
@@ -130,9 +163,37 @@ def _iterTreeEntries(oid):
     if not oid:
         return
     tree = data.getObject(oid, 'tree')
-    for entry in tree.decode ().splitlines ():
-        type_, oid, name = entry.split (' ', 2)
-        yield type_, oid, name
+    yield from data.iterTreeEntries(tree)
+
+
+def iterTreeChanges(fromTreeId, toTreeId, basePath = ""):
+    '''
+    Yields the path and the new object-id(None if deleted) of
+    every file that differs across the given tree objects.
+    Subtrees with the same object-id are skipped without
+    being loaded.
+    '''
+    if fromTreeId == toTreeId:
+        return
+    fromEntries = {name: (type_, oid) for type_, oid, name in _iterTreeEntries(fromTreeId)}
+    toEntries = {name: (type_, oid) for type_, oid, name in _iterTreeEntries(toTreeId)}
+
+    for name in sorted(fromEntries.keys() | toEntries.keys()):
+        fromType, fromOid = fromEntries.get(name, (None, None))
+        toType, toOid = toEntries.get(name, (None, None))
+        if fromType == toType and fromOid == toOid:
+            continue
+        path = basePath + name
+        fromSubtree = fromOid if fromType == "tree" else None
+        toSubtree = toOid if toType == "tree" else None
+        # A file replaced by a directory(or the other way around)
+        # is deleted before the new entries are added
+        if fromType == "blob" and toType != "blob":
+            yield path, None
+        if fromSubtree or toSubtree:
+            yield from iterTreeChanges(fromSubtree, toSubtree, f"{path}/")
+        if toType == "blob":
+            yield path, toOid
 
 
 def getTree(oid, base_path=''):
@@ -153,6 +214,62 @@ def getTree(oid, base_path=''):
             assert False, f'Unknown tree entry {type_}'
     return result
 
+def getPathOid(treeId, path):
+    '''
+    Returns the object-id of the file or directory at the given
+    path in a tree, or None if the path doesn't exist.
+    Only the trees along the path are loaded.
+    '''
+    oid = treeId
+    for i, name in enumerate(path):
+        if not oid:
+            return None
+        entry = data.findTreeEntry(data.getObject(oid, "tree"), name)
+        if entry is None:
+            return None
+        type_, oid = entry
+        # Only the last component can be a file
+        if type_ != "tree" and i != len(path) - 1:
+            return None
+    return oid
+
+
+def splitPath(path):
+    '''
+    Splits a path relative to the root of the repository into
+    its components.
+    '''
+    return [name for name in path.replace(os.sep, "/").split("/")
+            if name and name != "."]
+
+
+@data.mgit_required
+def iterCommitsTouching(oids, path):
+    '''
+    A generator which yields the commits reachable from the given
+    object-ids that changed the given path(a file or a directory).
+    A commit is skipped if the path has the same object-id as in
+    one of its parents.
+    '''
+    path = splitPath(path)
+    pathOids = {}
+
+    def getCommitPathOid(oid):
+        if oid not in pathOids:
+            pathOids[oid] = getPathOid(data.getCommit(oid)["tree"], path)
+        return pathOids[oid]
+
+    for oid in data.iterParentsAndCommits(oids):
+        pathOid = getCommitPathOid(oid)
+        parents = data.getCommit(oid)["parents"]
+        if parents:
+            if any(getCommitPathOid(parent) == pathOid for parent in parents):
+                continue
+        elif pathOid is None:
+            continue
+        yield oid
+
+
 @data.mgit_required
 def log(objectId = None):
     if not objectId:
@@ -244,23 +361,28 @@ def getBranches():
 @data.mgit_required
 def getWorkingTree():
     result = {}
-    for root, _, files in os.walk("."):
-        for file in files:
-            path = os.path.relpath(os.path.join(root, file))
-            if isIgnored(path) or not os.path.isfile(path):
-                continue
-            with open(path, "rb") as fileContent:
-                result[path] = data.hashObject(fileContent.read())
+    ignore.clearCache()
+    with data.objectBatch():
+        for root, dirnames, files in os.walk("."):
+            # Prune ignored directories before descending into them
+            dirnames[:] = [dirname for dirname in dirnames
+                           if not isIgnored(os.path.join(root, dirname), True)]
+            for file in files:
+                path = os.path.relpath(os.path.join(root, file))
+                if isIgnored(path) or not os.path.isfile(path):
+                    continue
+                result[path] = data.hashFile(path)
 
     return result
 
 @data.mgit_required
 def readTreeMerged(t_base, t_HEAD, t_other):
+    merged = diff.mergeTrees(getTree(t_base), getTree(t_HEAD), getTree(t_other))
+    # Store the merged blobs, so they can be checked out like any tree
+    files = {path: data.hashObject(blob) for path, blob in merged.items()}
     _emptyDirectory()
-    for path, blob in diff.mergeTrees(getTree(t_base), getTree(t_HEAD), getTree(t_other)).items ():
-        os.makedirs (f'./{os.path.dirname (path)}', exist_ok=True)
-        with open (path, 'wb') as f:
-            f.write (blob)
+    directories, files = workdir.planFiles(files)
+    workdir.checkout(directories, files, progress=workdir.reportProgress)
 
 
 @data.mgit_required
@@ -295,42 +417,49 @@ def getMergeBase(oid1, oid2):
         if oid in parents1:
             return oid
 
-def _createTree(objectId, basePath):
-    objectPath = os.path.join(".mgit", "objects", objectId)
+@data.mgit_required
+def gc(prune = False, gracePeriod = 14 * 24 * 60 * 60):
+    '''
+    Finds the objects that can't be reached from any reference.
+    If prune is set, the unreachable objects last modified more
+    than gracePeriod seconds ago are deleted, newer ones are kept
+    as they may belong to an operation still in progress.
+    Returns the number of unreachable and of deleted objects.
+    '''
+    index = reachable.OidIndex(reachable.iterLooseObjects())
+    marked = reachable.markReachable(index, reachable.iterRootOids())
+    expiry = time.time() - gracePeriod
+
+    unreachable = 0
+    deleted = 0
+    for position in range(len(index)):
+        if position in marked:
+            continue
+        unreachable += 1
+        if not prune:
+            continue
+        path = os.path.join(data.current().objectsDir, index[position])
+        try:
+            if os.stat(path).st_mtime < expiry:
+                os.remove(path)
+                deleted += 1
+        except FileNotFoundError:
+            pass
 
-    if not os.path.exists(objectPath):
-        raise FileNotFoundError("Tree with given object id doesn't exist.")
-    
-    with open(objectPath, "rb") as file:
-        treeObject = file.read()
-    
-    #Children array stores all the entries present in this tree object(its chidren)
-    children = data.parseTreeObject(treeObject)
-    
-    for child in children:
-        type_ = child["type_"]
-        name = child["name"]
-        oid = child["oid"]
-
-        #If the object is a blob, create a file and write
-        #the blob to the file
-        if type_ == "blob":
-            blob = data.getObject(oid, "blob")
-            with open(os.path.join(basePath, name), "wb") as file:
-                file.write(blob)
-        elif type_ == "tree":
-            os.makedirs(name, exist_ok = True)
-            _createTree(
-                objectId = oid, 
-                basePath = os.path.join(basePath, name)
-            )
+    return unreachable, deleted
 
 
 def _emptyDirectory():
     '''
     Empty the current directory
     '''
-    for root, dirnames, filenames in os.walk(".", topdown = False):
+    ignore.clearCache()
+    directories = []
+    # Walk top down so that ignored directories are pruned,
+    # the directories are removed bottom up afterwards
+    for root, dirnames, filenames in os.walk("."):
+        dirnames[:] = [dirname for dirname in dirnames
+                       if not isIgnored(os.path.join(root, dirname), True)]
         for filename in filenames:
             path = os.path.join(root, filename)
             if isIgnored(path):
@@ -339,22 +468,23 @@ def _emptyDirectory():
             print(path)
             os.remove(path)
         for dirname in dirnames:
-            path = os.path.join(root, dirname)
-            if isIgnored(path):
-                continue
+            directories.append(os.path.join(root, dirname))
 
-            try:
-                print(path)
-                os.rmdir(path)
-            except (FileNotFoundError, OSError):
-                # Since there are can be ignored files, in directories
-                # the directory may not be empty and deletion might
-                # fail which is the correct behaviour
-                pass
-
-def isIgnored(path):
-    splitPath = os.path.split(path)
+    for path in reversed(directories):
+        try:
+            print(path)
+            os.rmdir(path)
+        except (FileNotFoundError, OSError):
+            # Since there are can be ignored files, in directories
+            # the directory may not be empty and deletion might
+            # fail which is the correct behaviour
+            pass
+
+def isIgnored(path, isDir = False, root = "."):
+    # Compare whole path components, so that .mgitignore
+    # files aren't mistaken for the .mgit directory
+    splitPath = os.path.relpath(path, root).split(os.sep)
     for subPath in splitPath:
-        if ".mgit" in subPath:
+        if subPath == ".mgit":
             return True
-    return False
\ No newline at end of file
+    return ignore.isIgnored(path, isDir, root)
\ No newline at end of file
@@ -0,0 +1,105 @@
+import os
+import difflib
+import struct
+import tempfile
+import data
+import base
+
+# Matching blocks of blob pairs, cached in memory and on disk
+# under .mgit/cache/diff. Blobs never change, so entries never
+# need to be invalidated.
+DIFF_CACHE_DIR = os.path.join("cache", "diff")
+BLOCK = struct.Struct(">III")
+_diffCache = {}
+
+
+def _readLines(oid):
+    return data.getObject(oid).splitlines()
+
+
+@data.mgit_required
+def matchingBlocks(oldOid, newOid):
+    '''
+    Returns the (old line, new line, size) blocks of lines the
+    two blobs have in common, caching them by object-id pair.
+    '''
+    key = (oldOid, newOid)
+    if key in _diffCache:
+        return _diffCache[key]
+
+    cachePath = os.path.join(data.current().mgitDir, DIFF_CACHE_DIR, f"{oldOid}-{newOid}")
+    if os.path.exists(cachePath):
+        with open(cachePath, "rb") as file:
+            blocks = list(BLOCK.iter_unpack(file.read()))
+    else:
+        matcher = difflib.SequenceMatcher(None, _readLines(oldOid), _readLines(newOid),
+                                          autojunk=False)
+        blocks = [tuple(block) for block in matcher.get_matching_blocks() if block.size]
+        cacheDir = os.path.dirname(cachePath)
+        os.makedirs(cacheDir, exist_ok=True)
+        # Written to a temporary file and renamed, like objects, so that
+        # an interrupted or concurrent run never leaves a partial entry
+        fd, tempPath = tempfile.mkstemp(dir=cacheDir, prefix="tmp_")
+        with os.fdopen(fd, "wb") as file:
+            file.write(b"".join(BLOCK.pack(*block) for block in blocks))
+            # Shared like objects, which never change either
+            os.fchmod(file.fileno(), data.OBJECT_MODE)
+        os.replace(tempPath, cachePath)
+
+    _diffCache[key] = blocks
+    return blocks
+
+
+@data.mgit_required
+def blame(path, commitId = "HEAD"):
+    '''
+    Returns a list of (commit object-id, line) for every line of
+    the file at the given path, as of the given commit.
+    The first parent history is walked back, commits where the blob
+    didn't change are skipped, and only consecutive differing
+    versions of the blob are diffed. The walk stops as soon as
+    every line has been attributed.
+    '''
+    commitId = data.resolveOid(commitId)
+    path = base.splitPath(path)
+    blobId = base.getPathOid(data.getCommit(commitId)["tree"], path)
+    if blobId is None:
+        raise FileNotFoundError("No file found at the given path.")
+
+    lines = _readLines(blobId)
+    attribution = [None] * len(lines)
+    # Maps the lines of the current version of the blob, which
+    # are still unattributed, to lines of the final version
+    pending = {i: i for i in range(len(lines))}
+
+    while pending:
+        commit = data.getCommit(commitId)
+        parentId = commit["parents"][0] if commit["parents"] else None
+        parentBlobId = None
+        if parentId:
+            parentBlobId = base.getPathOid(data.getCommit(parentId)["tree"], path)
+
+        if parentBlobId == blobId:
+            commitId = parentId
+            continue
+
+        if parentBlobId is None:
+            # The file was created by this commit
+            for line in pending.values():
+                attribution[line] = commitId
+            break
+
+        moved = {}
+        for oldStart, newStart, size in matchingBlocks(parentBlobId, blobId):
+            for offset in range(size):
+                if newStart + offset in pending:
+                    moved[oldStart + offset] = pending.pop(newStart + offset)
+        # Lines not found in the parent's version were introduced here
+        for line in pending.values():
+            attribution[line] = commitId
+
+        pending = moved
+        commitId = parentId
+        blobId = parentBlobId
+
+    return list(zip(attribution, lines))
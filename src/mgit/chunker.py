@@ -0,0 +1,101 @@
+'''
+Content-defined chunking of large blobs, after FastCDC.
+A gear rolling hash runs over the content and a chunk ends where
+its top bits are all zero. Boundaries depend only on the bytes
+around them, so an edit only changes the chunks it touches and
+every other chunk deduplicates against the previous version.
+'''
+import hashlib
+
+MIN_SIZE = 64 * 1024
+AVERAGE_SIZE = 256 * 1024
+MAX_SIZE = 1024 * 1024
+
+_HASH_MASK = (1 << 64) - 1
+# Every step shifts the 64 bit hash by one, so it only depends
+# on the last 64 bytes
+WINDOW = 64
+# Random 64 bit values for every byte, derived deterministically
+# so that every repository cuts the same content the same way
+GEAR = [int.from_bytes(hashlib.sha1(bytes([i])).digest()[:8], "big") for i in range(256)]
+
+
+def _topBitsMask(bits):
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def _findCut(content, start, minSize, averageSize, maxSize):
+    '''
+    Returns the end of the chunk of content starting at start.
+    Normalised chunking is used: before the average size a boundary
+    is harder to hit(more bits must be zero) and after it easier,
+    which keeps chunk sizes close to the average.
+    '''
+    length = len(content)
+    if length - start <= minSize:
+        return length
+
+    bits = averageSize.bit_length() - 1
+    gear = GEAR
+    hashMask = _HASH_MASK
+    end = min(start + maxSize, length)
+    normal = min(start + averageSize, end)
+    i = start + minSize
+
+    # The hash only depends on the last WINDOW bytes, so it's seeded
+    # from the bytes just before the first possible boundary instead
+    # of running over the whole minimum size
+    rolling = 0
+    for byte in content[max(start, i - WINDOW):i]:
+        rolling = ((rolling << 1) + gear[byte]) & hashMask
+
+    for mask, stop in ((_topBitsMask(bits + 2), normal), (_topBitsMask(bits - 2), end)):
+        for i, byte in enumerate(content[i:stop], i):
+            rolling = ((rolling << 1) + gear[byte]) & hashMask
+            if not rolling & mask:
+                return i + 1
+        i = stop
+    return end
+
+
+def chunkBoundaries(content, minSize = MIN_SIZE, averageSize = AVERAGE_SIZE,
+                    maxSize = MAX_SIZE):
+    '''
+    Yields the (start, end) offsets of the chunks of content.
+    '''
+    start = 0
+    while start < len(content):
+        end = _findCut(content, start, minSize, averageSize, maxSize)
+        yield start, end
+        start = end
+
+
+def iterChunks(content):
+    '''
+    Yields the chunks of content as memoryviews.
+    '''
+    view = memoryview(content)
+    for start, end in chunkBoundaries(view):
+        yield view[start:end]
+
+
+def iterFileChunks(file, minSize = MIN_SIZE, averageSize = AVERAGE_SIZE,
+                   maxSize = MAX_SIZE):
+    '''
+    Yields the chunks of a binary file as it's read, holding at most
+    maxSize bytes of it in memory. The chunks are the same as the
+    ones of its whole content.
+    '''
+    buffer = b""
+    finished = False
+    while True:
+        # A cut only depends on the next maxSize bytes
+        while not finished and len(buffer) < maxSize:
+            block = file.read(maxSize)
+            finished = not block
+            buffer += block
+        if not buffer:
+            return
+        end = _findCut(buffer, 0, minSize, averageSize, maxSize)
+        yield buffer[:end]
+        buffer = buffer[end:]
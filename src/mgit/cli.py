@@ -1,11 +1,16 @@
 import typer
 import os
+from typing import List
 import sys
 import data
 import base
 import subprocess
 import textwrap
 import diff as myDiff
+import blame as myBlame
+import stream
+import remote
+import fsck as myFsck
 
 app = typer.Typer()
 
@@ -20,10 +25,7 @@ def init():
 @app.command()
 def hash_object(filepath):
     try:
-        with open(filepath, "rb") as file:
-            object = file.read()
-        
-        oid = data.hashObject(object)
+        oid = data.hashFile(filepath)
         print(oid)
     except FileNotFoundError as exception:
         print(exception)
@@ -64,22 +66,117 @@ def commit(message):
     except Exception as exception:
         print(exception)
 
+_STATUS_LETTERS = {
+    "New File": "A",
+    "Deleted": "D",
+    "Modified": "M",
+    "Renamed": "R",
+    "Copied": "C",
+}
+
+def _findRenames(fromTree, toTree, findRenames, findCopies, threshold, limit):
+    if not (findRenames or findCopies):
+        return None
+    return myDiff.findRenames(fromTree, toTree, threshold, limit, findCopies)
+
+def _printNameOnly(fromTree, toTree, nameStatus = False, renames = None):
+    '''
+    Prints the paths that changed across the given trees.
+    Unless renames are detected, only object-ids are compared
+    and no blob is loaded.
+    '''
+    renamed = {rename.destination: rename for rename in renames or ()}
+    for path, action in myDiff.iterChangedFiles(fromTree, toTree, renames):
+        if action == "Unchanged":
+            continue
+        if not nameStatus:
+            print(path)
+        elif path in renamed:
+            rename = renamed[path]
+            print(f"{_STATUS_LETTERS[action]}{rename.score:03d}\t{rename.source}\t{path}")
+        else:
+            print(f"{_STATUS_LETTERS[action]}\t{path}")
+
+def _printNumstat(fromTree, toTree, renames = None):
+    for path, inserted, deleted in myDiff.iterDiffStats(fromTree, toTree, renames):
+        if inserted is None:
+            print(f"-\t-\t{path}")
+        else:
+            print(f"{inserted}\t{deleted}\t{path}")
+
+def _printStat(fromTree, toTree, renames = None, width = 40):
+    stats = list(myDiff.iterDiffStats(fromTree, toTree, renames))
+    if not stats:
+        return
+
+    nameWidth = max(len(path) for path, _, _ in stats)
+    maxChanges = max((inserted + deleted for _, inserted, deleted in stats
+                      if inserted is not None), default=0)
+    countWidth = len(str(maxChanges))
+    totalInserted = 0
+    totalDeleted = 0
+
+    for path, inserted, deleted in stats:
+        if inserted is None:
+            print(f" {path.ljust(nameWidth)} | Bin")
+            continue
+        totalInserted += inserted
+        totalDeleted += deleted
+        changes = inserted + deleted
+        # scale the graph down if the largest change doesn't fit
+        if maxChanges > width:
+            plus = (inserted * width) // maxChanges
+            minus = (deleted * width) // maxChanges
+        else:
+            plus, minus = inserted, deleted
+        graph = "+" * plus + "-" * minus
+        print(f" {path.ljust(nameWidth)} | {str(changes).rjust(countWidth)} {graph}")
+
+    print(f" {len(stats)} file{'s' if len(stats) != 1 else ''} changed, "\
+          f"{totalInserted} insertions(+), {totalDeleted} deletions(-)")
+
+def _printDiff(fromTree, toTree, unifiedDiff, stat = False, numstat = False,
+               nameOnly = False, nameStatus = False, renames = None):
+    '''
+    Prints the difference between two trees in the requested format.
+    The summary formats take precedence over the unified diff.
+    '''
+    if nameOnly or nameStatus:
+        _printNameOnly(fromTree, toTree, nameStatus, renames)
+        return
+    if numstat:
+        _printNumstat(fromTree, toTree, renames)
+        return
+    if stat:
+        _printStat(fromTree, toTree, renames)
+        return
+
+    output = myDiff.diffTrees(fromTree, toTree, unifiedDiff, renames)
+    for change in output:
+        print(f"File changed: {change}")
+        if unifiedDiff:
+            for line in output[change]:
+                print(line)
+
 @app.command()
-def diff(commit_id = "HEAD"):
+def diff(commit_id = "HEAD", stat: bool = False, numstat: bool = False,
+         name_only: bool = False, name_status: bool = False,
+         find_renames: bool = False, find_copies: bool = False,
+         rename_threshold: int = 50, rename_limit: int = 1000):
     workingTree = base.getWorkingTree()
 
     objectId = data.getOid(commit_id)
     commit = data.getCommit(objectId)
     tree = base.getTree(commit["tree"])
-    
-    output = myDiff.diffTrees(tree, workingTree, True)
-    for change in output:
-        print(f"File changed: {change}")
-        for line in output[change]:
-            print(line)
+
+    renames = _findRenames(tree, workingTree, find_renames, find_copies,
+                           rename_threshold, rename_limit)
+    _printDiff(tree, workingTree, True, stat, numstat, name_only, name_status,
+               renames)
 
 @app.command()
-def status():
+def status(find_renames: bool = True, find_copies: bool = False,
+           rename_threshold: int = 50, rename_limit: int = 1000):
     branch = base.getBranchName()
 
     if not branch:
@@ -103,8 +200,15 @@ def status():
     commit = data.getCommit(objectId)
     tree = base.getTree(commit["tree"])
 
-    for path, action in myDiff.iterChangedFiles(tree, workingTree):
-        print(f"File action: {path} ({action})")
+    renames = _findRenames(tree, workingTree, find_renames, find_copies,
+                           rename_threshold, rename_limit)
+    renamed = {rename.destination: rename for rename in renames or ()}
+    for path, action in myDiff.iterChangedFiles(tree, workingTree, renames):
+        if path in renamed:
+            rename = renamed[path]
+            print(f"File action: {path} ({action} from {rename.source}, {rename.score}%)")
+        else:
+            print(f"File action: {path} ({action})")
 
 
 @app.command()
@@ -127,7 +231,8 @@ def _printCommit(oid, ref = None):
         print(textwrap.indent(line, "   "))
 
 @app.command()
-def log(object_id = "@"):
+def log(object_id = "@", path: str = typer.Argument(None),
+        max_count: int = typer.Option(None, "-n", "--max-count")):
     # Fetch all tags and create a reverse look up(commitId->tag)
     lookUp = {}
     for tag, commitId in data.iterRefs(prefix=os.path.join("ref", "tags")):
@@ -136,9 +241,24 @@ def log(object_id = "@"):
     if object_id == "@":
         object_id = data.getRef("HEAD", deref=True).value
     else:
-        object_id = data.getOid(object_id)
+        try:
+            object_id = data.getOid(object_id)
+        except Exception:
+            # A lone argument which isn't a commit is a path,
+            # e.g: mgit log -- <path>
+            if path is not None:
+                raise
+            path = object_id
+            object_id = data.getRef("HEAD", deref=True).value
+
+    if path is None:
+        commits = data.iterParentsAndCommits({object_id})
+    else:
+        commits = base.iterCommitsTouching({object_id}, path)
 
-    for oid in data.iterParentsAndCommits({object_id}):
+    for count, oid in enumerate(commits):
+        if max_count is not None and count >= max_count:
+            break
         if oid in lookUp:
             _printCommit(oid, lookUp[oid])
         else:
@@ -146,7 +266,11 @@ def log(object_id = "@"):
 
 
 @app.command()
-def show(commit_id, unified_diff: bool = False):
+def show(commit_id, unified_diff: bool = False, stat: bool = False,
+         numstat: bool = False, name_only: bool = False,
+         name_status: bool = False, find_renames: bool = False,
+         find_copies: bool = False, rename_threshold: int = 50,
+         rename_limit: int = 1000):
     _printCommit(commit_id)
     commit = data.getCommit(commit_id)
     
@@ -157,12 +281,10 @@ def show(commit_id, unified_diff: bool = False):
             parentCommit = data.getCommit(commit["parents"][0])
             parentTree = base.getTree(parentCommit["tree"])
 
-    output = myDiff.diffTrees(parentTree, tree, unified_diff)
-    for change in output:
-        print(f"File changed: {change}")
-        if unified_diff:
-            for line in output[change]:
-                print(line)
+    renames = _findRenames(parentTree, tree, find_renames, find_copies,
+                           rename_threshold, rename_limit)
+    _printDiff(parentTree, tree, unified_diff, stat, numstat,
+               name_only, name_status, renames)
 
 @app.command()
 def checkout(name):
@@ -230,5 +352,91 @@ def reset(commit_id, hard: bool = False):
     except Exception as exception:
         print(exception)
 
+@app.command()
+def blame(path, commit_id = "HEAD"):
+    try:
+        attribution = myBlame.blame(path, commit_id)
+    except Exception as exception:
+        print(exception)
+        return
+
+    width = len(str(len(attribution)))
+    for lineNo, (oid, line) in enumerate(attribution, 1):
+        sys.stdout.buffer.write(f"{oid[:10]} {str(lineNo).rjust(width)}) ".encode() + line + b"\n")
+    sys.stdout.flush()
+
+@app.command()
+def commit_tree(tree, message: str = typer.Option(..., "-m", "--message"),
+                parents: List[str] = typer.Option(None, "-p", "--parent")):
+    try:
+        tree = data.resolveOid(tree)
+        # Make sure the objects exist before pointing a commit at them
+        data.getObject(tree, expected="tree")
+        parents = [data.resolveOid(parent) for parent in parents or []]
+        for parent in parents:
+            data.getCommit(parent)
+        print(base.writeCommit(tree, parents, message))
+    except Exception as exception:
+        print(exception)
+
+@app.command()
+def clone(path, directory = None):
+    try:
+        local = remote.clone(path, directory)
+        print(f"Cloned into {local.path}")
+    except Exception as exception:
+        print(exception)
+
+@app.command()
+def fetch(path, name = remote.DEFAULT_REMOTE):
+    try:
+        transferred, updated = remote.fetch(path, name)
+        print(f"{transferred} objects fetched")
+        for ref, oid in updated:
+            print(f"{ref} -> {oid}")
+    except Exception as exception:
+        print(exception)
+
+@app.command()
+def fast_export(refs: List[str] = typer.Argument(None)):
+    try:
+        stream.exportHistory(sys.stdout.buffer, refs or None)
+        sys.stdout.flush()
+    except Exception as exception:
+        # stdout carries the stream
+        print(exception, file=sys.stderr)
+
+@app.command()
+def fast_import():
+    try:
+        commits = stream.importHistory(sys.stdin.buffer)
+        print(f"Imported {commits} commits", file=sys.stderr)
+    except Exception as exception:
+        print(exception)
+
+@app.command()
+def gc(prune: bool = False, expire_days: float = 14):
+    try:
+        unreachable, deleted = base.gc(prune, expire_days * 24 * 60 * 60)
+        print(f"{unreachable} unreachable objects")
+        if prune:
+            print(f"{deleted} objects pruned")
+    except Exception as exception:
+        print(exception)
+
+@app.command()
+def fsck(workers: int = typer.Option(None, "-j", "--jobs")):
+    try:
+        checked, errors, dangling = myFsck.fsck(workers, progress=myFsck.reportProgress)
+        for oid, error in errors:
+            print(f"error: {oid} {error}")
+        print(f"{checked} objects checked, {len(errors)} errors, {dangling} dangling")
+    except Exception as exception:
+        print(exception)
+        sys.exit(1)
+    # Scripts check the health of the repository by the exit status
+    if errors:
+        sys.exit(1)
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
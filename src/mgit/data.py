@@ -1,23 +1,574 @@
 import os
+import time
 import hashlib
 import string
+import struct
+import tempfile
+import chunker
+from contextlib import contextmanager
 from collections import deque, namedtuple
 
-MGIT_DIR = "./.mgit"
+MGIT_DIR_NAME = ".mgit"
+MGIT_DIR = os.path.join(".", MGIT_DIR_NAME)
+
+# If set, objects and references are flushed to disk before
+# they are made visible
+FSYNC = os.environ.get("MGIT_FSYNC", "") not in ("", "0")
+# Seconds to wait for the lock of a reference held by another writer
+REF_LOCK_TIMEOUT = 1.0
+# Permissions of object files
+OBJECT_MODE = 0o444
+# Blobs of at least this size are stored as deduplicated chunks
+# (0 turns chunking off). Chunking runs in Python at about 8 MB/s,
+# a cost paid whenever a new version of such a file is stored
+CHUNK_THRESHOLD = int(os.environ.get("MGIT_CHUNK_THRESHOLD", 16 * 1024 * 1024))
+
+# A chunked blob is stored under its blob object-id with this type,
+# followed by the object-id and the size of each of its chunks
+CHUNKED_BLOB_TYPE = "chunked-blob"
+CHUNK_TYPE = "chunk"
+MANIFEST_ENTRY = struct.Struct(">20sI")
+
+# Binary tree objects start with this marker, which can't start
+# a text tree object("type oid name" lines)
+TREE_MAGIC = b"\x00tree2"
+# Entry count, followed by one offset per entry
+TREE_HEADER = struct.Struct(">I")
+TREE_OFFSET = struct.Struct(">I")
+# Mode of an entry, followed by its raw oid and a NUL terminated name
+TREE_ENTRY = struct.Struct(">I20s")
+TREE_MODES = {
+    "blob": 0o100644,
+    "tree": 0o040000,
+}
+TREE_TYPES = {mode: type_ for type_, mode in TREE_MODES.items()}
 
 RefValue = namedtuple("RefValue", ["symbolic", "value"])
 
+# Number of parsed commits kept in memory by a repository
+COMMIT_CACHE_SIZE = 4096
 
-def mgit_required(func):
+
+class StaleRefError(Exception):
     '''
-    This decorator is used to make sure the mgit directory exists.
+    Raised when a reference no longer holds the value a writer
+    expected to replace.
     '''
-    def wrapper(*args, **kwargs):
-        if not os.path.exists(MGIT_DIR):
+
+
+class Repository:
+    '''
+    A mgit repository rooted at the given path.
+    The repository is validated once, when it's opened, and holds
+    its own paths and caches, so that several repositories can be
+    worked on in one process without changing directory.
+    '''
+    def __init__(self, path = "."):
+        self.path = os.path.abspath(path)
+        self.mgitDir = os.path.join(self.path, MGIT_DIR_NAME)
+        self.objectsDir = os.path.join(self.mgitDir, "objects")
+        if not os.path.isdir(self.mgitDir):
             raise FileNotFoundError("This is not a mgit repository."\
                                 "Use the mgit init command to make this a git repository.")
+        # Parsed commits by object-id. Objects never change,
+        # so entries never need to be invalidated.
+        self._commits = {}
+        # Temporary files of the objects waiting for the end of a
+        # batch, by object path. None outside a batch.
+        self._batch = None
+
+    @classmethod
+    def init(cls, path = "."):
+        '''
+        Creates a mgit repository at the given path and returns it.
+        If the path is already a repository, raise a FileExists exception.
+        '''
+        mgitDir = os.path.join(path, MGIT_DIR_NAME)
+        if os.path.exists(mgitDir):
+            raise FileExistsError("Already a mgit repository.")
+        os.makedirs(mgitDir)
+        os.makedirs(os.path.join(mgitDir, "objects"))
+        os.makedirs(os.path.join(mgitDir, "ref", "heads"))
+        # create master branch on init
+        with open(os.path.join(mgitDir, "ref", "heads", "master"), "w"):
+            pass
+        return cls(path)
+
+    def hashObject(self, data, type_ = "blob"):
+        '''
+        This function is used to create an object and store in the
+        object database of the mgit repository. 
+        By default, the type is assumed to be blob.
+        '''
+        # Add type tag
+        header = type_.encode() + b"\x00"
+        # oid => object id
+        digest = hashlib.sha1(header)
+        digest.update(data)
+        oid = digest.hexdigest()
+
+        if self._refreshObject(oid):
+            return oid
+
+        # Large blobs are split into chunks shared across versions,
+        # the blob object-id stays the hash of the whole content
+        if type_ == "blob" and CHUNK_THRESHOLD and len(data) >= CHUNK_THRESHOLD:
+            self._writeChunkedBlob(oid, chunker.iterChunks(data))
+        else:
+            self._writeObject(oid, (header, data))
+        return oid
+
+    def hashFile(self, path):
+        '''
+        Stores the content of the file at the given path as a blob
+        and returns its object-id. Files large enough to be chunked
+        are streamed rather than read into memory.
+        '''
+        if not CHUNK_THRESHOLD or os.path.getsize(path) < CHUNK_THRESHOLD:
+            with open(path, "rb") as file:
+                return self.hashObject(file.read())
+
+        digest = hashlib.sha1(b"blob\x00")
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(chunker.MAX_SIZE), b""):
+                digest.update(block)
+        oid = digest.hexdigest()
+
+        # Unchanged files are never chunked again
+        if not self._refreshObject(oid):
+            with open(path, "rb") as file:
+                self._writeChunkedBlob(oid, chunker.iterFileChunks(file))
+        return oid
+
+    def _writeChunkedBlob(self, oid, chunks):
+        '''
+        Stores the chunks of a blob, followed by the manifest
+        listing them under the object-id of the blob.
+        '''
+        digest = hashlib.sha1(b"blob\x00")
+        manifest = []
+        for chunk in chunks:
+            digest.update(chunk)
+            chunkId = self.hashObject(chunk, CHUNK_TYPE)
+            manifest.append(MANIFEST_ENTRY.pack(bytes.fromhex(chunkId), len(chunk)))
+        # A file can change between being hashed and being chunked
+        if digest.hexdigest() != oid:
+            raise Exception("The content changed while it was being stored.")
+        self._writeObject(oid, (CHUNKED_BLOB_TYPE.encode() + b"\x00", b"".join(manifest)))
+
+    def _refreshObject(self, oid):
+        '''
+        Returns True if the object already exists.
+        Objects are immutable, an existing one only needs its
+        modification time refreshed so gc doesn't prune it.
+        '''
+        objectPath = os.path.join(self.objectsDir, oid)
+        if self._batch and objectPath in self._batch:
+            return True
+        if os.path.exists(objectPath):
+            os.utime(objectPath)
+            return True
+        return False
+
+    def _writeObject(self, oid, parts):
+        '''
+        Stores the given parts(bytes-like) as the file of an object.
+        '''
+        objectPath = os.path.join(self.objectsDir, oid)
+        # Write to a temporary file first and rename it, so that
+        # readers never see a partially written object
+        fd, tempPath = tempfile.mkstemp(dir=self.objectsDir, prefix="tmp_obj_")
+        with os.fdopen(fd, "wb") as file:
+            for part in parts:
+                file.write(part)
+            # mkstemp creates owner-only files, objects are read-only
+            # and readable by everyone, like the files open creates
+            os.fchmod(file.fileno(), OBJECT_MODE)
+            if FSYNC and self._batch is None:
+                file.flush()
+                os.fsync(file.fileno())
+
+        if FSYNC and self._batch is not None:
+            self._batch[objectPath] = tempPath
         else:
-            return func(*args, **kwargs)
+            os.replace(tempPath, objectPath)
+
+    @contextmanager
+    def objectBatch(self):
+        '''
+        Groups the objects written within the context, so that they're
+        flushed together at the end instead of one by one as they're
+        written, and the directory is flushed once for all of them.
+        The objects are made visible once they have been flushed,
+        until then they're read from their temporary files.
+        Nested batches join the outermost one.
+        '''
+        if self._batch is not None:
+            yield
+            return
+
+        self._batch = {}
+        try:
+            yield
+            pending = self._batch
+        except BaseException:
+            for tempPath in self._batch.values():
+                os.remove(tempPath)
+            raise
+        finally:
+            self._batch = None
+
+        if pending:
+            # Only the files of this batch are flushed, not the whole
+            # machine's, and none is visible before all of them are
+            for tempPath in pending.values():
+                _fsyncPath(tempPath)
+            for objectPath, tempPath in pending.items():
+                os.replace(tempPath, objectPath)
+            _fsyncPath(self.objectsDir)
+
+    def hasObject(self, objectId):
+        '''
+        Returns True if the object database holds the given object-id.
+        '''
+        objectPath = os.path.join(self.objectsDir, objectId)
+        return bool(self._batch and objectPath in self._batch) or os.path.exists(objectPath)
+
+    def _openObject(self, objectId):
+        objectPath = os.path.join(self.objectsDir, self.getOid(objectId))
+        if self._batch and objectPath in self._batch:
+            objectPath = self._batch[objectPath]
+        try:
+            return open(objectPath, "rb")
+        except FileNotFoundError:
+            raise FileNotFoundError("No object found with given object id.")
+
+    def getObject(self, objectId, expected = "blob"):
+        '''
+        This function takes in an object id(sha1 hash) and returns the
+        content of the object.
+        '''
+        with self._openObject(objectId) as file:
+            object = file.read()
+
+        type_, _, data = object.partition(b"\x00")
+        type_ = type_.decode ()
+
+        # Chunked blobs are reassembled from their chunks
+        if type_ == CHUNKED_BLOB_TYPE:
+            type_ = "blob"
+            data = b"".join(self.getObject(chunkId, CHUNK_TYPE)
+                            for chunkId, _ in _iterManifest(data))
+
+        if expected is not None:
+            assert type_ == expected, f'Expected {expected}, got {type_}'
+        return data
+
+    def streamObject(self, objectId, expected = "blob", chunkSize = 1 << 16):
+        '''
+        A generator which yields the content of an object in chunks,
+        without reading the whole object into memory.
+        Chunked blobs are streamed one chunk at a time.
+        '''
+        with self._openObject(objectId) as file:
+            chunk = file.read(chunkSize)
+            type_, _, chunk = chunk.partition(b"\x00")
+            type_ = type_.decode()
+
+            manifest = None
+            if type_ == CHUNKED_BLOB_TYPE:
+                type_ = "blob"
+                manifest = chunk + file.read()
+
+            if expected is not None:
+                assert type_ == expected, f'Expected {expected}, got {type_}'
+
+            if manifest is None:
+                while chunk:
+                    yield chunk
+                    chunk = file.read(chunkSize)
+
+        if manifest is not None:
+            for chunkId, _ in _iterManifest(manifest):
+                yield self.getObject(chunkId, CHUNK_TYPE)
+
+    def getChunkIds(self, objectId):
+        '''
+        Returns the object-ids of the chunks a blob is stored as,
+        or an empty list if the blob isn't chunked.
+        '''
+        with self._openObject(objectId) as file:
+            header = file.read(len(CHUNKED_BLOB_TYPE) + 1)
+            if header != CHUNKED_BLOB_TYPE.encode() + b"\x00":
+                return []
+            return [chunkId for chunkId, _ in _iterManifest(file.read())]
+
+    def updateRef(self, reference, refValue, deref = True, expected = None):
+        '''
+        Update a reference to point to the given RefValue(refValue).
+        If reference doesn't exist, a reference is created.
+        The reference is locked while it's updated. If expected is
+        given, the update only happens if the reference still holds
+        that value(an object-id, or "" for a new branch), else a
+        StaleRefError is raised.
+        Note: The reference must be a relative path from the
+        .mgit directory. 
+        E.g: To create a tag named "example", the reference
+        passed in as an argument must be, "ref/tags/example".
+        The reference is created in, ".mgit/ref/tags/example".
+        '''
+        refPath = os.path.join(self.mgitDir, reference)
+        os.makedirs(os.path.dirname(refPath), exist_ok=True)
+
+        # create the reference file
+        if not os.path.exists(refPath):
+            open(refPath, "a").close()
+
+        reference = self._getRefInternal(reference, deref)[0]
+        # If deref is set to true, refPath needs to be updated
+        # to the reference being pointed to
+        if deref:
+            refPath = os.path.join(self.mgitDir, reference)
+        assert refValue.value
+        if refValue.symbolic:
+            refValue = f"ref: {refValue.value}"
+        else:
+            refValue = refValue.value
+
+        with _lockRef(refPath) as lockFile:
+            if expected is not None:
+                current = self._getRefInternal(reference, deref=False)[1].value
+                if current != expected:
+                    raise StaleRefError(f"Reference {reference} was updated by another "\
+                                        f"writer, expected {expected or 'no value'}, "\
+                                        f"found {current or 'no value'}.")
+            lockFile.write(refValue.encode())
+
+    def getRef(self, reference, deref = True):
+        '''
+        Returns the object-id pointed to by the given reference.
+        If a reference points to another reference(a symbolic ref), 
+        the references are recursively tracked down and the object id 
+        the last reference points to is returned.
+        Note: The reference must be a relative path from the
+        .mgit directory. 
+        E.g: To create a tag named "example", the reference
+        passed in as an argument must be, "ref/tags/example".
+        The reference is created in, ".mgit/ref/tags/example".
+        '''
+        return self._getRefInternal(reference, deref)[1]
+
+    def _getRefInternal(self, reference, deref):
+        '''
+        Returns a reference name and a RefValue named tuple. 
+        If a reference points to another reference(a symbolic ref), 
+        the references are recursively tracked down and the reference
+        of the last oid, and a RefValue are returned.
+        '''
+        refPath = os.path.join(self.mgitDir, reference)
+        try:
+            with open(refPath, "r") as file:
+                value = file.read().strip()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise FileNotFoundError("No reference found with given path.")
+
+        symbolic = bool (value) and value.startswith("ref:")
+        if symbolic:
+            value = value.split(":", 1)[1].strip()
+            if deref:
+                return self._getRefInternal(value, deref)
+
+        return reference, RefValue(symbolic=symbolic, value=value)
+
+    def getOid(self, name):
+        '''
+        Returns the object-id associated with the tag.
+        If the tag is an object-id, the tag itself it returned.
+        '''
+        # Object-ids are by far the most common names, so they're
+        # recognised before any reference is looked up
+        if _isOid(name):
+            return name
+
+        try:
+            return self.getRef(self.resolveRef(name), deref=False).value
+        except FileNotFoundError:
+            # If the name isn't an oid either, raise an exception
+            raise Exception("Object-id not found for the given name.")
+
+    def resolveRef(self, name):
+        '''
+        Returns the full name of the reference a short name(e.g: a
+        branch or a tag name) refers to.
+        '''
+        if name == "@":
+            name = "HEAD"
+        # Search for the provided tag in the following directories
+        # This way, the search for the reference will happen in
+        # .mgit directory(user specifies ref/tags/tag)
+        # .mgit/ref directory(user specifies tags/tag)
+        # .mgit/ref/teags directory(user specifies tag)
+        # .mgit/ref/heads
+        refsToTry = [
+            name,
+            os.path.join("ref", name),
+            os.path.join("ref", "tags", name),
+            os.path.join("ref", "heads", name)
+        ]
+
+        for ref in refsToTry:
+            try:
+                self.getRef(ref, deref=False)
+                return ref
+            except Exception:
+                continue
+
+        raise FileNotFoundError(f"Reference not found: {name}")
+
+    def resolveOid(self, name):
+        '''
+        Returns the object-id a name refers to, following a symbolic
+        reference(e.g: HEAD) to the reference it points to.
+        '''
+        oid = self.getOid(name)
+        if oid and not _isOid(oid):
+            oid = self.getOid(oid)
+        return oid
+
+    def iterRefs(self, prefix = "", deref = True):
+        '''
+        Iterates over all the references, return a reference name and
+        the reference(object-id).
+        '''
+        refs = ["HEAD"]
+        if os.path.exists(os.path.join(self.mgitDir, "MERGE_HEAD")):
+            refs.append("MERGE_HEAD")
+        # Walk over all refs
+        for root, _, filenames in os.walk(os.path.join(self.mgitDir, "ref")):
+            root = os.path.relpath(root, self.mgitDir)
+
+            for file in filenames:
+                # Skip the lock files of references being updated
+                if file.endswith(".lock"):
+                    continue
+                refs.append(os.path.join(root, file))
+
+        for refname in refs:
+            if not refname.startswith(prefix):
+                continue
+            ref = self.getRef(refname, deref=deref)
+            yield refname, ref
+
+    def iterParentsAndCommits(self, oids):
+        '''
+        A generator which returns all the parents and commits
+        reachable from a given set of object-ids.
+        Note: Even if an object is reachable from multiple commits, 
+        its returned only once.
+        '''
+        oids = deque(oids)
+        visited = set()
+
+        while oids:
+            oid = oids.popleft()
+            # if not oid is needed as the previous oid may not have 
+            # a parent
+            if not oid or oid in visited:
+                continue
+
+            visited.add(oid)
+
+            parents = self.getCommit(oid)["parents"]
+
+            # Add first parent next
+            oids.extendleft(parents[:1])
+            # Add other parents later
+            oids.extend(parents[1:])
+            yield oid
+
+    def getCommit(self, objectId):
+        '''
+        This function returns a dictionary representing a commit object.
+        commit = {
+            tree: object-id of the tree,
+            parent: object-id of the previous commit, if it exists,
+            message: The commit message
+        }
+        Parsed commits are cached, a copy is returned.
+        '''
+        objectId = self.resolveOid(objectId)
+        commit = self._commits.get(objectId)
+        if commit is None:
+            commit = _parseCommit(self.getObject(objectId, expected = "commit"))
+            if _isOid(objectId):
+                if len(self._commits) >= COMMIT_CACHE_SIZE:
+                    # Evict the oldest entry
+                    self._commits.pop(next(iter(self._commits)))
+                self._commits[objectId] = commit
+
+        return dict(commit, parents=list(commit["parents"]))
+
+    def deleteRef(self, ref, deref=True):
+        ref = self._getRefInternal(ref, deref)[0]
+        with _lockRef(os.path.join(self.mgitDir, ref), delete=True):
+            pass
+
+    def createBranch(self, branchName, startPoint):
+        '''
+        Create a branch with the give branchName and startPoint
+        (object-id)
+        '''
+        self.updateRef(os.path.join("ref", "heads", branchName),
+                       RefValue(symbolic=False, value=startPoint))
+
+
+# Repositories opened for the current directory, by path
+_repositories = {}
+# Repository of the current directory, as of the last time it
+# was resolved
+_current = None
+
+
+def current():
+    '''
+    Returns the Repository of the current directory. The directory
+    is only resolved the first time, and again by every operation
+    decorated with mgit_required, so that the object and reference
+    functions below don't look it up on every call. A process
+    changing directory picks up the new repository at its next
+    mgit_required operation.
+    '''
+    if _current is None:
+        return _openCurrent()
+    return _current
+
+
+def _openCurrent():
+    '''
+    Resolves the repository of the current directory, which is
+    opened(and validated) only the first time it's used.
+    '''
+    global _current
+    path = os.path.abspath(MGIT_DIR)
+    repository = _repositories.get(path)
+    if repository is None:
+        repository = Repository(os.path.dirname(path))
+        _repositories[path] = repository
+    _current = repository
+    return repository
+
+
+def mgit_required(func):
+    '''
+    This decorator is used to make sure the mgit directory exists.
+    The repository is only checked the first time it's opened.
+    Operations given a repository(as the repository keyword
+    argument) don't need one in the current directory.
+    '''
+    def wrapper(*args, **kwargs):
+        if kwargs.get("repository") is None:
+            _openCurrent()
+        return func(*args, **kwargs)
             
     return wrapper
 
@@ -27,269 +578,333 @@ def init():
     This function is called when initialising a mgit repository.
     If the .mgit directory doesn't already exist, create one.
     If exists, raise a FileExists exception."
+    Returns the new Repository.
+    '''
+    path = os.path.abspath(MGIT_DIR)
+    repository = _repositories[path] = Repository.init(os.path.dirname(path))
+    return repository
+
+
+def _iterManifest(manifest):
+    '''
+    Yields the object-id and the size of each chunk listed in
+    the manifest of a chunked blob.
+    '''
+    for rawOid, size in MANIFEST_ENTRY.iter_unpack(manifest):
+        yield rawOid.hex(), size
+
+
+def _isOid(name):
+    return len(name) == 40 and all(c in string.hexdigits for c in name)
+
+
+def _fsyncPath(path):
+    '''
+    Flushes a file, or the entries(e.g: renames) of a directory,
+    to disk.
     '''
-    if os.path.exists(MGIT_DIR):
-        raise FileExistsError("Already a mgit repository.")
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def _lockRef(refPath, delete = False, timeout = None):
+    '''
+    Holds the lock of a reference, a "<reference>.lock" file created
+    exclusively, and yields it opened for writing.
+    The new value of the reference is written to the lock file, which
+    is renamed over the reference on exit. If delete is set, the
+    reference is removed instead. On error the reference is left
+    untouched and the lock is released.
+    '''
+    if timeout is None:
+        timeout = REF_LOCK_TIMEOUT
+    lockPath = refPath + ".lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            break
+        except FileExistsError:
+            if time.monotonic() >= deadline:
+                raise FileExistsError(f"Unable to lock reference, {lockPath} exists. "\
+                                      "Another mgit process may be running.")
+            time.sleep(0.01)
+
+    try:
+        with open(fd, "wb") as file:
+            yield file
+            file.flush()
+            if FSYNC and not delete:
+                os.fsync(file.fileno())
+    except BaseException:
+        os.remove(lockPath)
+        raise
+
+    if delete:
+        os.remove(refPath)
+        os.remove(lockPath)
     else:
-        os.makedirs(MGIT_DIR)
-        os.makedirs(os.path.join(MGIT_DIR, "objects"))
-        os.makedirs(os.path.join(MGIT_DIR, "ref", "heads"))
-        # create master branch on init
-        with open(os.path.join(MGIT_DIR, "ref", "heads", "master"), "w"):
-            pass
+        os.replace(lockPath, refPath)
+
+
+def _parseCommit(data):
+    data = data.decode()
+
+    commit = {}
+    commit["parents"] = []
+
+    lines = iter(data.splitlines())
+
+    for line in lines:
+        if line == "":
+            break
+        key, value = line.split(" ", 1)
+        if key == "tree":
+            commit["tree"] = value
+        elif key == "parent":
+            commit["parents"].append(value)
+        else:
+            raise Exception(f"Unknow Key found: {key}")
+    
+    commit["message"] = "\n".join(lines)
+
+    return commit
+
+
+# The operations below work on the repository of the current directory
 
-@mgit_required
 def hashObject(data, type_ = "blob"):
     '''
     This function is used to create an object and store in the
     object database of the mgit repository. 
     By default, the type is assumed to be blob.
     '''
+    return current().hashObject(data, type_)
 
-    # Add type tag
-    data = type_.encode() + b"\x00" + data
-    # oid => object id
-    oid = hashlib.sha1(data).hexdigest()
-    # Create a blob object in the object database
-    with open(os.path.join(os.getcwd(), MGIT_DIR, "objects", oid), "wb") as file:
-        file.write(data)
 
-    return oid
+def hashFile(path):
+    '''
+    Stores the content of the file at the given path as a blob.
+    See Repository.hashFile.
+    '''
+    return current().hashFile(path)
+
+
+def objectBatch():
+    '''
+    Groups the objects written within the context, see
+    Repository.objectBatch.
+    '''
+    return current().objectBatch()
 
 
-@mgit_required
 def getObject(objectId, expected = "blob"):
     '''
     This function takes in an object id(sha1 hash) and returns the
     content of the object.
     '''
-    objectId = getOid(objectId)
-    if not os.path.exists(os.path.join(MGIT_DIR, "objects", objectId)):
-        raise FileNotFoundError("No object found with given object id.")
-    else:
-        with open(os.path.join(MGIT_DIR, "objects", objectId), "rb") as file:
-            object = file.read()
-        
-        type_, _, data = object.partition(b"\x00")
-        type_ = type_.decode ()
+    return current().getObject(objectId, expected)
 
-        if expected is not None:
-            assert type_ == expected, f'Expected {expected}, got {type_}'
-        return data
-    
 
-@mgit_required
-def updateRef(reference, refValue, deref = True):
+def streamObject(objectId, expected = "blob", chunkSize = 1 << 16):
     '''
-    Update a reference to point to the given RefValue(refValue).
-    If reference doesn't exist, a reference is created.
-    Note: The reference must be a relative path from the
-    .mgit directory. 
-    E.g: To create a tag named "example", the reference
-    passed in as an argument must be, "ref/tags/example".
-    The reference is created in, ".mgit/ref/tags/example".
-    '''
-    refPath = os.path.join(MGIT_DIR, reference)
-    os.makedirs(os.path.dirname(refPath), exist_ok=True)
-
-    # create the reference file
-    if not os.path.exists(refPath):
-        open(refPath, "w")
-        
-    reference = _getRefInternal(reference, deref)[0]
-    # If deref is set to true, refPath needs to be updated
-    # to the reference being pointed to
-    if deref:
-        refPath = os.path.join(MGIT_DIR, reference)
-    assert refValue.value
-    if refValue.symbolic:
-        refValue = f"ref: {refValue.value}"
-    else:
-        refValue = refValue.value
-        
+    A generator which yields the content of an object in chunks,
+    without reading the whole object into memory.
+    '''
+    return current().streamObject(objectId, expected, chunkSize)
 
-    with open(refPath, "w") as file:
-        file.write(refValue)
+
+def getChunkIds(objectId):
+    '''
+    Returns the object-ids of the chunks a blob is stored as,
+    or an empty list if the blob isn't chunked.
+    '''
+    return current().getChunkIds(objectId)
+
+
+def updateRef(reference, refValue, deref = True, expected = None):
+    '''
+    Update a reference to point to the given RefValue(refValue).
+    See Repository.updateRef.
+    '''
+    current().updateRef(reference, refValue, deref, expected)
 
 
-@mgit_required
 def getRef(reference, deref = True):
     '''
     Returns the object-id pointed to by the given reference.
-    If a reference points to another reference(a symbolic ref), 
-    the references are recursively tracked down and the object id 
-    the last reference points to is returned.
-    Note: The reference must be a relative path from the
-    .mgit directory. 
-    E.g: To create a tag named "example", the reference
-    passed in as an argument must be, "ref/tags/example".
-    The reference is created in, ".mgit/ref/tags/example".
-    '''
-    return _getRefInternal(reference, deref)[1]
-
-@mgit_required
-def _getRefInternal(reference, deref):
+    See Repository.getRef.
     '''
-    Returns a reference name and a RefValue named tuple. 
-    If a reference points to another reference(a symbolic ref), 
-    the references are recursively tracked down and the reference
-    of the last oid, and a RefValue are returned.
-    Note: The reference must be a relative path from the
-    .mgit directory. 
-    E.g: To create a tag named "example", the reference
-    passed in as an argument must be, "ref/tags/example".
-    The reference is created in, ".mgit/ref/tags/example".
-    '''
-    refPath = os.path.join(MGIT_DIR, reference)
-    value = None
-    if not os.path.exists(refPath):
-        raise FileNotFoundError("No reference found with given path.")
-    
-    with open(refPath, "r") as file:
-        value = file.read().strip()
+    return current().getRef(reference, deref)
+
+
+def _getRefInternal(reference, deref):
+    return current()._getRefInternal(reference, deref)
 
-    symbolic = bool (value) and value.startswith("ref:")
-    if symbolic:
-        value = value.split(":", 1)[1].strip()
-        if deref:
-            return _getRefInternal(value, deref)
-    
-    return reference, RefValue(symbolic=symbolic, value=value)
 
-@mgit_required
 def getOid(name):
     '''
     Returns the object-id associated with the tag.
     If the tag is an object-id, the tag itself it returned.
     '''
-    if name == "@":
-        name = "HEAD"
-    # Search for the provided tag in the following directories
-    # This way, the search for the reference will happen in
-    # .mgit directory(user specifies ref/tags/tag)
-    # .mgit/ref directory(user specifies tags/tag)
-    # .mgit/ref/teags directory(user specifies tag)
-    # .mgit/ref/heads
-    refsToTry = [
-        name,
-        os.path.join("ref", name),
-        os.path.join("ref", "tags", name),
-        os.path.join("ref", "heads", name)
-    ]
-
-    for ref in refsToTry:
-        try:
-            return getRef(ref, deref=False).value
-        except Exception:
-            continue
-
-    # If no ref has been found for the give name, name might be an oid
-    # Name is SHA1
-    is_hex = all (c in string.hexdigits for c in name)
-    if len (name) == 40 and is_hex:
-        return name
-    
-    # If the name isn't an oid either, raise an exception
-    raise Exception("Object-id not found for the given name.")
+    return current().getOid(name)
+
+
+def resolveRef(name):
+    '''
+    Returns the full name of the reference a short name refers to.
+    See Repository.resolveRef.
+    '''
+    return current().resolveRef(name)
+
+
+def resolveOid(name):
+    '''
+    Returns the object-id a name refers to, following a symbolic
+    reference(e.g: HEAD) to the reference it points to.
+    '''
+    return current().resolveOid(name)
 
 
-@mgit_required
 def iterRefs(prefix = "", deref = True):
     '''
     Iterates over all the references, return a reference name and
     the reference(object-id).
     '''
-    refs = ["HEAD"]
-    if os.path.exists(os.path.join(MGIT_DIR, "MERGE_HEAD")):
-        refs.append("MERGE_HEAD")
-    # Walk over all refs
-    for root, _, filenames in os.walk(os.path.join(MGIT_DIR, "ref")):
-        root = os.path.relpath(root, MGIT_DIR)
-
-        for file in filenames:
-            refs.append(os.path.join(root, file))
-
-    for refname in refs:
-        if not refname.startswith(prefix):
-            continue
-        ref = getRef(refname, deref=deref)
-        yield refname, ref
+    return current().iterRefs(prefix, deref)
 
 
-@mgit_required
 def iterParentsAndCommits(oids):
     '''
     A generator which returns all the parents and commits
     reachable from a given set of object-ids.
-    Note: Even if an object is reachable from multiple commits, 
-    its returned only once.
     '''
-    oids = deque(oids)
-    visited = set()
+    return current().iterParentsAndCommits(oids)
 
-    while oids:
-        oid = oids.popleft()
-        # if not oid is needed as the previous oid may not have 
-        # a parent
-        if not oid or oid in visited:
-            continue
-
-        visited.add(oid)
-
-        commit = getCommit(oid)
-        if "parents" in commit:
-            parents = commit["parents"]
-        else:
-            parents = []
-        
-        # Add first parent next
-        oids.extendleft(parents[:1])
-        # Add other parents later
-        oids.extend(parents[1:])
-        yield oid
 
 def getCommit(objectId):
     '''
     This function returns a dictionary representing a commit object.
-    commit = {
-        tree: object-id of the tree,
-        parent: object-id of the previous commit, if it exists,
-        message: The commit message
-    }
+    See Repository.getCommit.
     '''
-    data = getObject(objectId, expected = "commit").decode()
-
-    commit = {}
-    commit["parents"] = []
-
-    lines = iter(data.splitlines())
-
-    for line in lines:
-        if line == "":
-            break
-        key, value = line.split(" ", 1)
-        if key == "tree":
-            commit["tree"] = value
-        elif key == "parent":
-            commit["parents"].append(value)
-        else:
-            raise Exception(f"Unknow Key found: {key}")
-    
-    commit["message"] = "\n".join(lines)
+    return current().getCommit(objectId)
 
-    return commit
 
 def deleteRef(ref, deref=True):
-    ref = _getRefInternal(ref, deref)[0]
-    os.remove(os.path.join(MGIT_DIR, ref))
+    current().deleteRef(ref, deref)
+
 
-@mgit_required
 def createBranch(branchName, startPoint):
     '''
     Create a branch with the give branchName and startPoint
     (object-id)
     '''
-    updateRef(os.path.join("ref", "heads", branchName), RefValue(symbolic=False, value=startPoint))
+    current().createBranch(branchName, startPoint)
+
+def encodeTree(entries):
+    '''
+    Returns the data of a binary tree object for the given
+    (type, object-id, name) entries.
+    Entries are sorted by name and preceded by a table of their
+    offsets, so that a single entry can be looked up with a
+    binary search.
+    '''
+    encoded = []
+    for type_, oid, name in sorted(entries, key=lambda entry: entry[2].encode()):
+        name = name.encode()
+        if b"\x00" in name or b"/" in name:
+            raise ValueError(f"Invalid name in tree entry: {name}")
+        encoded.append(TREE_ENTRY.pack(TREE_MODES[type_], bytes.fromhex(oid)) + name + b"\x00")
+
+    offset = len(TREE_MAGIC) + TREE_HEADER.size + TREE_OFFSET.size * len(encoded)
+    offsets = []
+    for entry in encoded:
+        offsets.append(TREE_OFFSET.pack(offset))
+        offset += len(entry)
+
+    return TREE_MAGIC + TREE_HEADER.pack(len(encoded)) + b"".join(offsets) + b"".join(encoded)
+
+
+def isBinaryTree(treeData):
+    return treeData[:len(TREE_MAGIC)] == TREE_MAGIC
+
+
+def _treeOffsets(treeData):
+    '''
+    Returns the entry count and the offset of the offset table
+    of a binary tree.
+    '''
+    start = len(TREE_MAGIC)
+    count, = TREE_HEADER.unpack_from(treeData, start)
+    return count, start + TREE_HEADER.size
+
+
+def _readTreeEntry(treeData, offset):
+    '''
+    Returns the mode, the raw oid and the name(as bytes)
+    of the binary tree entry at the given offset.
+    '''
+    mode, rawOid = TREE_ENTRY.unpack_from(treeData, offset)
+    start = offset + TREE_ENTRY.size
+    return mode, rawOid, treeData[start:treeData.find(b"\x00", start)]
+
+
+def iterTreeEntries(treeData):
+    '''
+    Lazily yields the (type, object-id, name) entries of the data
+    of a tree object, in either the text or the binary format.
+    Binary entries are read in place, only the entry being yielded
+    is decoded.
+    '''
+    if not isBinaryTree(treeData):
+        for line in treeData.decode().splitlines():
+            type_, oid, name = line.split(" ", 2)
+            yield type_, oid, name
+        return
+
+    count, tableStart = _treeOffsets(treeData)
+    table = memoryview(treeData)[tableStart:tableStart + count * TREE_OFFSET.size]
+    # _readTreeEntry, inlined as this is the hot path of every
+    # walk over trees
+    unpackEntry = TREE_ENTRY.unpack_from
+    find = treeData.find
+    for offset, in TREE_OFFSET.iter_unpack(table):
+        mode, rawOid = unpackEntry(treeData, offset)
+        start = offset + TREE_ENTRY.size
+        yield TREE_TYPES[mode], rawOid.hex(), treeData[start:find(b"\x00", start)].decode()
+
+
+def findTreeEntry(treeData, name):
+    '''
+    Returns the (type, object-id) of the entry with the given name
+    in the data of a tree object, or None if there is none.
+    Binary trees are binary searched through their offset table.
+    '''
+    if not isBinaryTree(treeData):
+        for type_, oid, entryName in iterTreeEntries(treeData):
+            if entryName == name:
+                return type_, oid
+        return None
+
+    count, tableStart = _treeOffsets(treeData)
+    key = name.encode()
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        offset, = TREE_OFFSET.unpack_from(treeData, tableStart + middle * TREE_OFFSET.size)
+        mode, rawOid, entryName = _readTreeEntry(treeData, offset)
+        if entryName == key:
+            return TREE_TYPES[mode], rawOid.hex()
+        if entryName < key:
+            low = middle + 1
+        else:
+            high = middle
+    return None
+
 
 def parseTreeObject(treeObj):
     #Get the data of the tree object
@@ -303,10 +918,9 @@ def parseTreeObject(treeObj):
     #which consists of type of object, object id and object name
     children = []
 
-    for line in data.splitlines():
-        words = line.split()
+    for type_, oid, name in iterTreeEntries(data):
         children.append({
-            "type_": words[0].decode(), "oid": words[1].decode(), "name": words[2].decode()
+            "type_": type_, "oid": oid, "name": name
         })
 
     return children
\ No newline at end of file
@@ -1,9 +1,15 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 import data
 import difflib
 from tempfile import NamedTemporaryFile as Temp
 import subprocess
 
+Rename = namedtuple("Rename", ["source", "destination", "score", "copy"])
+
+# Lines longer than this are split into several chunks when
+# fingerprinting a blob for similarity scoring
+CHUNK_SIZE = 64
+
 def diffBlobs(blobId1, blobId2):
     '''
     Returns the unified difference between two blobs
@@ -21,6 +27,53 @@ def diffBlobs(blobId1, blobId2):
     
     return diff
 
+
+def _readBlobLines(blobId):
+    '''
+    Returns the lines of a blob as bytes, without decoding them.
+    A missing blob(None) is treated as an empty file.
+    '''
+    if not blobId:
+        return []
+    return data.getObject(blobId).splitlines()
+
+
+def countBlobChanges(blobId1, blobId2):
+    '''
+    Returns the number of inserted and deleted lines between
+    two blobs. No hunk text is built, the counts are read
+    straight off the matcher's opcodes.
+    If either blob is binary, (None, None) is returned.
+    '''
+    blob1 = _readBlobLines(blobId1)
+    blob2 = _readBlobLines(blobId2)
+
+    if any(b"\x00" in line for line in blob1) or \
+        any(b"\x00" in line for line in blob2):
+        return None, None
+
+    inserted = 0
+    deleted = 0
+    matcher = difflib.SequenceMatcher(None, blob1, blob2)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        deleted += i2 - i1
+        inserted += j2 - j1
+
+    return inserted, deleted
+
+
+def iterDiffStats(fromTree, toTree, renames = None):
+    '''
+    Yields a file path along with the number of inserted and
+    deleted lines for each file that differs across the given
+    trees.
+    '''
+    for path, fromOid, toOid in _iterChangedPairs(fromTree, toTree, renames):
+        inserted, deleted = countBlobChanges(fromOid, toOid)
+        yield path, inserted, deleted
+
 def groupTrees(*trees):
     '''
     Group the given trees by file paths and their oids
@@ -42,28 +95,66 @@ def groupTrees(*trees):
         yield (path, *oids)
 
         
-def diffTrees(fromTree, toTree, unifiedDiff = False):
+def _indexRenames(renames):
+    '''
+    Returns a lookup of renames by destination path, and the
+    set of source paths that were renamed(not copied) away.
+    '''
+    renamed = {}
+    sources = set()
+    for rename in renames or ():
+        renamed[rename.destination] = rename
+        if not rename.copy:
+            sources.add(rename.source)
+    return renamed, sources
+
+
+def _iterChangedPairs(fromTree, toTree, renames = None):
+    '''
+    Yields a display path along with the old and the new object-id
+    of each file that changed across the given trees. A renamed or
+    copied file is paired with its source.
+    '''
+    renamed, sources = _indexRenames(renames)
+    for path, fromOid, toOid in groupTrees(fromTree, toTree):
+        if path in renamed:
+            rename = renamed[path]
+            yield f"{rename.source} => {path}", fromTree[rename.source], toOid
+        elif path in sources and not toOid:
+            continue
+        elif fromOid != toOid:
+            yield path, fromOid, toOid
+
+
+def diffTrees(fromTree, toTree, unifiedDiff = False, renames = None):
     '''
     returns a string which lists the files that have 
     changed across the given trees.
     '''
     diff = {}
-    for path, fromOid, toOid in groupTrees(fromTree, toTree):
-        if fromOid != toOid:
-            diff[path] = None
-            if unifiedDiff:
-                diff[path] = diffBlobs(fromOid, toOid)
+    for path, fromOid, toOid in _iterChangedPairs(fromTree, toTree, renames):
+        diff[path] = None
+        if unifiedDiff:
+            diff[path] = diffBlobs(fromOid, toOid)
     
     return diff
 
 
-def iterChangedFiles(fromTree, toTree):
+def iterChangedFiles(fromTree, toTree, renames = None):
     '''
     Yields an action(modified, new file, deleted, unchanged) for 
     each file in the given trees.
+    If a list of renames(see findRenames) is given, the destination
+    of each is reported as renamed or copied and the source of a
+    rename is no longer reported as deleted.
     '''
+    renamed, sources = _indexRenames(renames)
     for path, fromOid, toOid in groupTrees(fromTree, toTree):
-        if not fromOid:
+        if path in renamed:
+            action = "Copied" if renamed[path].copy else "Renamed"
+        elif path in sources and not toOid:
+            continue
+        elif not fromOid:
             action = "New File"
         elif not toOid:
             action = "Deleted"
@@ -74,6 +165,107 @@ def iterChangedFiles(fromTree, toTree):
         yield path, action
 
 
+def _fingerprint(blobId):
+    '''
+    Returns the size of a blob and a mapping of chunk hashes to the
+    number of bytes the blob holds in chunks with that hash.
+    A chunk is a line, split further every CHUNK_SIZE bytes.
+    '''
+    blob = data.getObject(blobId)
+    chunks = defaultdict(int)
+    for line in blob.splitlines(keepends=True):
+        for start in range(0, len(line), CHUNK_SIZE):
+            chunk = line[start:start + CHUNK_SIZE]
+            chunks[hash(chunk)] += len(chunk)
+    return len(blob), chunks
+
+
+def findRenames(fromTree, toTree, threshold = 50, limit = 1000, copies = False):
+    '''
+    Returns a list of Renames pairing files added in toTree with
+    files of fromTree they were moved or copied from.
+    Identical object-ids are paired first. The remaining added files
+    are scored against the deleted ones(every file of fromTree if
+    copies is set) through an index of chunk hashes, so only the
+    candidates sharing content with a file are ever compared.
+    A pair is reported if its score(percentage of shared bytes)
+    reaches the threshold. Similarity scoring is skipped if the
+    number of candidate pairs exceeds the limit.
+    '''
+    fromTree = fromTree or {}
+    toTree = toTree or {}
+    added = [path for path in toTree if path not in fromTree]
+    deleted = [path for path in fromTree if path not in toTree]
+    if copies:
+        candidates = list(fromTree)
+    else:
+        candidates = deleted
+
+    renames = []
+    used = set()
+
+    # Exact matches, looked up by object-id
+    byOid = defaultdict(list)
+    for path in candidates:
+        byOid[fromTree[path]].append(path)
+
+    remaining = []
+    for path in added:
+        sources = byOid.get(toTree[path])
+        if not sources:
+            remaining.append(path)
+            continue
+        # Prefer a deleted source that hasn't been paired yet
+        source = next((s for s in sources if s not in used and s not in toTree),
+                      sources[0])
+        copy = source in used or source in toTree
+        if copy and not copies:
+            remaining.append(path)
+            continue
+        used.add(source)
+        renames.append(Rename(source, path, 100, copy))
+
+    sources = [path for path in candidates if copies or path not in used]
+    if not remaining or not sources or len(remaining) * len(sources) > limit:
+        return renames
+
+    # Inexact matches, scored through an inverted index of chunk hashes
+    sizes = []
+    index = defaultdict(list)
+    for i, path in enumerate(sources):
+        size, chunks = _fingerprint(fromTree[path])
+        sizes.append(size)
+        for chunkHash, count in chunks.items():
+            index[chunkHash].append((i, count))
+
+    pairs = []
+    for path in remaining:
+        size, chunks = _fingerprint(toTree[path])
+        common = defaultdict(int)
+        for chunkHash, count in chunks.items():
+            for i, sourceCount in index.get(chunkHash, ()):
+                common[i] += min(count, sourceCount)
+        for i, shared in common.items():
+            score = shared * 100 // max(size, sizes[i], 1)
+            if score >= threshold:
+                pairs.append((score, path, sources[i]))
+
+    # Assign the best scoring pairs first
+    pairs.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+    paired = set()
+    for score, path, source in pairs:
+        if path in paired:
+            continue
+        copy = source in used or source in toTree
+        if copy and not copies:
+            continue
+        paired.add(path)
+        used.add(source)
+        renames.append(Rename(source, path, score, copy))
+
+    return renames
+
+
 def mergeTrees(t_base, t_HEAD, t_other):
     '''
     Takes in two tree objects and returns back a tree object
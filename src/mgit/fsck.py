@@ -0,0 +1,150 @@
+import os
+import sys
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import data
+import reachable
+
+# Number of objects handed to a worker process at a time
+CHUNK_SIZE = 256
+
+# Repository of the worker process, set by _initWorker
+_repository = None
+
+
+def _initWorker(path):
+    global _repository
+    _repository = data.Repository(path)
+
+
+def _checkObject(oid):
+    '''
+    Checks that the object hashes to its object-id and that its
+    content parses as its type.
+    Returns (object-id, type, references, error), references being
+    the (type, object-id) of the objects it refers to.
+    '''
+    repository = _repository
+    try:
+        with open(os.path.join(repository.objectsDir, oid), "rb") as file:
+            object = file.read()
+    except OSError as exception:
+        return oid, None, [], f"can't be read: {exception}"
+
+    type_, separator, _ = object.partition(b"\x00")
+    if not separator:
+        return oid, None, [], "has no type header"
+    type_ = type_.decode(errors="replace")
+
+    references = []
+    try:
+        if type_ == data.CHUNKED_BLOB_TYPE:
+            # The object-id of a chunked blob is the hash of its content
+            type_ = "blob"
+            references = [(data.CHUNK_TYPE, chunkId)
+                          for chunkId in repository.getChunkIds(oid)]
+            for _, chunkId in references:
+                if not repository.hasObject(chunkId):
+                    return oid, type_, [], f"is missing its chunk {chunkId}"
+            digest = hashlib.sha1(b"blob\x00")
+            for chunk in repository.streamObject(oid, "blob"):
+                digest.update(chunk)
+        else:
+            digest = hashlib.sha1(object)
+
+        if digest.hexdigest() != oid:
+            return oid, type_, [], f"hashes to {digest.hexdigest()}"
+
+        if type_ == "tree":
+            references = [(entry["type_"], entry["oid"])
+                          for entry in data.parseTreeObject(object)]
+        elif type_ == "commit":
+            commit = repository.getCommit(oid)
+            references = [("tree", commit["tree"])]
+            references += [("commit", parent) for parent in commit["parents"]]
+        elif type_ not in ("blob", data.CHUNK_TYPE):
+            return oid, type_, [], f"has an unknown type {type_!r}"
+    except Exception as exception:
+        return oid, type_, [], f"is corrupt: {exception!r}"
+
+    return oid, type_, references, None
+
+
+def reportProgress(done, total):
+    '''
+    Prints the fsck progress on a single line of stderr.
+    '''
+    percent = done * 100 // total if total else 100
+    end = "\n" if done == total else ""
+    print(f"\rChecking objects: {percent}% ({done}/{total})",
+          end=end, file=sys.stderr, flush=True)
+
+
+@data.mgit_required
+def fsck(workers = None, progress = None):
+    '''
+    Verifies every object of the current repository: its content
+    must hash to its object-id and parse as its type. Objects are
+    hashed on a pool of worker processes, progress is called with
+    the number of objects checked and the total.
+    The objects reachable from every reference are then walked to
+    find missing objects and entries of the wrong type.
+    Returns the number of objects checked, the (object-id, problem)
+    errors and the number of dangling(unreachable) objects.
+    '''
+    repository = data.current()
+    oids = sorted(reachable.iterLooseObjects())
+    total = len(oids)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    types = {}
+    references = {}
+    errors = []
+    if progress:
+        progress(0, total)
+
+    if workers > 1 and total > CHUNK_SIZE:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                                       initargs=(repository.path,))
+        results = executor.map(_checkObject, oids, chunksize=CHUNK_SIZE)
+    else:
+        executor = None
+        _initWorker(repository.path)
+        results = map(_checkObject, oids)
+
+    try:
+        for done, (oid, type_, refs, error) in enumerate(results, 1):
+            if error:
+                errors.append((oid, error))
+            else:
+                types[oid] = type_
+                if refs:
+                    references[oid] = refs
+            if progress and (done % CHUNK_SIZE == 0 or done == total):
+                progress(done, total)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    # Connectivity, from every reference
+    corrupt = {oid for oid, _ in errors}
+    visited = set()
+    pending = [("commit", oid) for oid in reachable.iterRootOids()]
+    while pending:
+        expected, oid = pending.pop()
+        if oid in visited:
+            continue
+        visited.add(oid)
+        if oid not in types:
+            # Corrupt objects have already been reported
+            if oid not in corrupt:
+                errors.append((oid, f"missing {expected}"))
+            continue
+        if types[oid] != expected:
+            errors.append((oid, f"is a {types[oid]}, expected a {expected}"))
+            continue
+        pending.extend(references.get(oid, ()))
+
+    dangling = sum(1 for oid in types if oid not in visited)
+    return total, errors, dangling
@@ -0,0 +1,168 @@
+import os
+import re
+from collections import namedtuple
+
+IGNORE_FILE = ".mgitignore"
+
+Rule = namedtuple("Rule", ["regex", "negate", "dirOnly"])
+# rules: compiled rules in the order they appear in the ignore file
+# fileRegex/dirRegex: all rules combined into a single regex, only
+# set when no rule is negated(the first match then decides)
+RuleSet = namedtuple("RuleSet", ["rules", "fileRegex", "dirRegex"])
+
+# Compiled rules of each directory(None if the directory has
+# no ignore file)
+_cache = {}
+
+
+def translatePattern(pattern):
+    '''
+    Translates a gitignore style glob into a regex matching
+    a path relative to the directory of the ignore file.
+    A pattern without a slash(other than a trailing one) matches
+    a name at any depth, otherwise it's anchored to the directory.
+    '''
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                charClass = pattern[i + 1:end]
+                if charClass.startswith("!"):
+                    charClass = "^" + charClass[1:]
+                regex += f"[{charClass}]"
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return regex
+
+
+def compileRules(lines):
+    '''
+    Compiles the lines of an ignore file into a RuleSet.
+    '''
+    rules = []
+    for line in lines:
+        line = line.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dirOnly = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        rules.append(Rule(translatePattern(line), negate, dirOnly))
+
+    fileRegex = None
+    dirRegex = None
+    if not any(rule.negate for rule in rules):
+        fileRules = [rule.regex for rule in rules if not rule.dirOnly]
+        if fileRules:
+            fileRegex = re.compile("|".join(f"(?:{r})" for r in fileRules))
+        if rules:
+            dirRegex = re.compile("|".join(f"(?:{rule.regex})" for rule in rules))
+
+    compiled = [Rule(re.compile(rule.regex), rule.negate, rule.dirOnly)
+                for rule in rules]
+    return RuleSet(compiled, fileRegex, dirRegex)
+
+
+def clearCache():
+    '''
+    Forgets the compiled rules, so that the ignore files are
+    read again. Called at the start of every scan of the
+    working directory.
+    '''
+    _cache.clear()
+
+
+def loadRules(directory):
+    '''
+    Returns the RuleSet of the ignore file in the given directory,
+    or None if there is no ignore file. Rules are compiled once
+    per directory until the cache is cleared.
+    '''
+    directory = os.path.normpath(directory)
+    if directory in _cache:
+        return _cache[directory]
+
+    ruleSet = None
+    try:
+        with open(os.path.join(directory, IGNORE_FILE), "r") as file:
+            ruleSet = compileRules(file)
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    _cache[directory] = ruleSet
+    return ruleSet
+
+
+def _match(ruleSet, path, isDir):
+    '''
+    Returns True/False if a rule of the set decides whether
+    the path is ignored, else None.
+    '''
+    if ruleSet.dirRegex is not None or ruleSet.fileRegex is not None:
+        regex = ruleSet.dirRegex if isDir else ruleSet.fileRegex
+        if regex is not None and regex.fullmatch(path):
+            return True
+        return None
+
+    # The last matching rule decides
+    for rule in reversed(ruleSet.rules):
+        if rule.dirOnly and not isDir:
+            continue
+        if rule.regex.fullmatch(path):
+            return not rule.negate
+    return None
+
+
+def isIgnored(path, isDir = False, root = "."):
+    '''
+    Returns True if the path is ignored by the ignore files
+    of the root directory and of the directories leading to it.
+    Rules of a deeper ignore file take precedence.
+    Note: The directories containing the path aren't checked,
+    callers walking the tree are expected to prune ignored
+    directories before descending into them.
+    '''
+    parts = os.path.relpath(path, root).split(os.sep)
+    ignored = False
+    directory = root
+    for depth in range(len(parts)):
+        ruleSet = loadRules(directory)
+        if ruleSet is not None:
+            decision = _match(ruleSet, "/".join(parts[depth:]), isDir)
+            if decision is not None:
+                ignored = decision
+        directory = os.path.join(directory, parts[depth])
+    return ignored
@@ -0,0 +1,114 @@
+import os
+import data
+
+
+class OidIndex:
+    '''
+    A sorted index of object-ids, stored as one buffer of raw
+    20 byte oids. Each oid is identified by its position, which
+    lets sets of objects be kept as bitsets.
+    '''
+    def __init__(self, oids):
+        raw = sorted(bytes.fromhex(oid) for oid in oids)
+        self._raw = b"".join(raw)
+        self._count = len(raw)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        return self._raw[position * 20:(position + 1) * 20].hex()
+
+    def find(self, oid):
+        '''
+        Returns the position of the given object-id, or
+        None if it isn't in the index.
+        '''
+        try:
+            key = bytes.fromhex(oid)
+        except ValueError:
+            return None
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            current = self._raw[middle * 20:(middle + 1) * 20]
+            if current == key:
+                return middle
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+
+class Bitset:
+    '''
+    A fixed size set of positions, one bit per position.
+    '''
+    def __init__(self, size):
+        self._bits = bytearray((size + 7) // 8)
+
+    def add(self, position):
+        self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, position):
+        return bool(self._bits[position >> 3] & (1 << (position & 7)))
+
+
+@data.mgit_required
+def iterLooseObjects():
+    '''
+    Yields the object-ids of all the objects in the object database.
+    '''
+    with os.scandir(data.current().objectsDir) as entries:
+        for entry in entries:
+            if entry.is_file() and len(entry.name) == 40:
+                yield entry.name
+
+
+@data.mgit_required
+def iterRootOids():
+    '''
+    Yields the object-ids pointed to by every reference,
+    including HEAD and MERGE_HEAD.
+    '''
+    for _, ref in data.iterRefs():
+        if ref.value and not ref.symbolic:
+            yield ref.value
+
+
+@data.mgit_required
+def markReachable(index, roots):
+    '''
+    Returns a Bitset of the positions in the index of every object
+    reachable from the given commit object-ids, through the parents
+    and trees of commits, the entries of trees and the chunks
+    of chunked blobs.
+    Objects missing from the index aren't followed.
+    '''
+    marked = Bitset(len(index))
+    pending = [("commit", oid) for oid in roots]
+
+    while pending:
+        type_, oid = pending.pop()
+        position = index.find(oid)
+        if position is None or position in marked:
+            continue
+        marked.add(position)
+
+        if type_ == "commit":
+            commit = data.getCommit(oid)
+            pending.append(("tree", commit["tree"]))
+            for parent in commit["parents"]:
+                pending.append(("commit", parent))
+        elif type_ == "tree":
+            for entryType, entryOid, _ in data.iterTreeEntries(data.getObject(oid, "tree")):
+                pending.append((entryType, entryOid))
+        elif type_ == "blob":
+            # Chunked blobs keep their chunks alive
+            for chunkId in data.getChunkIds(oid):
+                pending.append((data.CHUNK_TYPE, chunkId))
+
+    return marked
@@ -0,0 +1,143 @@
+import os
+import shutil
+import data
+import workdir
+
+DEFAULT_REMOTE = "origin"
+
+
+def findMissingObjects(remote, local, tips):
+    '''
+    Returns the object-ids of the objects reachable from the given
+    commits of the remote repository that the local one doesn't have,
+    every object listed after the objects it refers to.
+    The walk stops at commits and trees the local repository already
+    has, as it has everything they refer to.
+    '''
+    missing = []
+    visited = set()
+    # (type, object-id, expanded) entries, an object is listed once
+    # everything it refers to has been listed
+    stack = [("commit", tip, False) for tip in tips]
+
+    while stack:
+        type_, oid, expanded = stack.pop()
+        if expanded:
+            missing.append(oid)
+            continue
+        if not oid or oid in visited:
+            continue
+        visited.add(oid)
+        if local.hasObject(oid):
+            continue
+
+        stack.append((type_, oid, True))
+        if type_ == "commit":
+            commit = remote.getCommit(oid)
+            stack.append(("tree", commit["tree"], False))
+            for parent in commit["parents"]:
+                stack.append(("commit", parent, False))
+        elif type_ == "tree":
+            for entryType, entryOid, _ in data.iterTreeEntries(remote.getObject(oid, "tree")):
+                stack.append((entryType, entryOid, False))
+        elif type_ == "blob":
+            for chunkId in remote.getChunkIds(oid):
+                stack.append((data.CHUNK_TYPE, chunkId, False))
+
+    return missing
+
+
+def transferObjects(remote, local, oids):
+    '''
+    Hardlinks the given objects of the remote repository into the
+    local one, copying them if they can't be linked(e.g: the
+    repositories are on different filesystems).
+    Objects are immutable, so sharing them is safe.
+    '''
+    for oid in oids:
+        source = os.path.join(remote.objectsDir, oid)
+        destination = os.path.join(local.objectsDir, oid)
+        try:
+            os.link(source, destination)
+        except FileExistsError:
+            continue
+        except OSError:
+            temp = destination + ".tmp"
+            shutil.copyfile(source, temp)
+            os.replace(temp, destination)
+
+
+def fetch(remotePath, name = DEFAULT_REMOTE, local = None):
+    '''
+    Fetches the branches and tags of the repository at remotePath.
+    Only the objects missing locally are transferred. Branches are
+    stored as remote-tracking references, ref/remotes/<name>/<branch>,
+    tags the local repository doesn't have are created.
+    Returns the number of objects transferred and the updated
+    (reference, object-id) pairs.
+    '''
+    remote = data.Repository(remotePath)
+    local = local or data.current()
+
+    branches = [(os.path.relpath(ref, os.path.join("ref", "heads")), value.value)
+                for ref, value in remote.iterRefs(prefix=os.path.join("ref", "heads"))]
+    tags = [(ref, value.value)
+            for ref, value in remote.iterRefs(prefix=os.path.join("ref", "tags"))]
+    branches = [(branch, oid) for branch, oid in branches if oid]
+    tags = [(tag, oid) for tag, oid in tags if oid]
+
+    missing = findMissingObjects(remote, local, [oid for _, oid in branches + tags])
+    transferObjects(remote, local, missing)
+
+    updated = []
+    for branch, oid in branches:
+        ref = os.path.join("ref", "remotes", name, branch)
+        local.updateRef(ref, data.RefValue(symbolic=False, value=oid), deref=False)
+        updated.append((ref, oid))
+    for tag, oid in tags:
+        try:
+            local.getRef(tag)
+        except FileNotFoundError:
+            local.updateRef(tag, data.RefValue(symbolic=False, value=oid), deref=False)
+            updated.append((tag, oid))
+
+    return len(missing), updated
+
+
+def clone(remotePath, directory = None, name = DEFAULT_REMOTE):
+    '''
+    Creates a repository in directory(by default, named after the
+    remote), fetches the repository at remotePath into it, and checks
+    out the branch the remote's HEAD points to.
+    Returns the new Repository.
+    '''
+    remotePath = os.path.abspath(remotePath)
+    if directory is None:
+        directory = os.path.basename(remotePath.rstrip(os.sep))
+    os.makedirs(directory, exist_ok=True)
+    local = data.Repository.init(directory)
+
+    fetch(remotePath, name, local)
+
+    remote = data.Repository(remotePath)
+    HEAD = remote.getRef("HEAD", deref=False)
+    branch = "master"
+    if HEAD.symbolic:
+        branch = os.path.relpath(HEAD.value, os.path.join("ref", "heads"))
+
+    local.updateRef("HEAD", data.RefValue(symbolic=True, value=os.path.join(
+        "ref", "heads", branch
+    )), deref=False)
+
+    try:
+        oid = local.getRef(os.path.join("ref", "remotes", name, branch)).value
+    except FileNotFoundError:
+        # The remote has no commits on that branch yet
+        return local
+
+    local.updateRef(os.path.join("ref", "heads", branch),
+                    data.RefValue(symbolic=False, value=oid), deref=False)
+    directories, files = workdir.planTree(local.getCommit(oid)["tree"], repository=local)
+    workdir.checkout(directories, files, basePath=directory, repository=local,
+                     progress=workdir.reportProgress)
+    return local
@@ -0,0 +1,258 @@
+'''
+A streaming text format for moving whole histories in and out
+of a repository, modelled on git's fast-import format:
+
+    blob
+    mark :<mark>
+    data <size>
+    <size bytes of content>
+
+    commit
+    mark :<mark>
+    data <size>
+    <size bytes of message>
+    from <:mark or object-id>
+    merge <:mark or object-id>
+    M 100644 <:mark or object-id> <path>
+    D <path>
+
+    reset <reference>
+    from <:mark or object-id>
+
+File changes of a commit are relative to its first parent.
+'''
+import data
+import base
+from treebuilder import TreeBuilder
+
+BLOB_MODE = "100644"
+# Number of objects written between two flushes of the object batch
+BATCH_SIZE = 10000
+
+
+def _topologicalOrder(oids):
+    '''
+    Returns the commits reachable from the given object-ids,
+    every parent listed before its children.
+    '''
+    order = []
+    visited = set()
+    for tip in oids:
+        stack = [(tip, False)]
+        while stack:
+            oid, expanded = stack.pop()
+            if expanded:
+                order.append(oid)
+                continue
+            if not oid or oid in visited:
+                continue
+            visited.add(oid)
+            stack.append((oid, True))
+            for parent in reversed(data.getCommit(oid)["parents"]):
+                stack.append((parent, False))
+    return order
+
+
+def _writeData(out, content):
+    out.write(f"data {len(content)}\n".encode())
+    out.write(content)
+    out.write(b"\n")
+
+
+@data.mgit_required
+def exportHistory(out, refs = None):
+    '''
+    Writes the commits, trees(as file changes) and blobs reachable
+    from the given references to the binary stream out.
+    By default every branch and tag is exported, references can be
+    given by their short names(e.g: master).
+    '''
+    if refs is None:
+        refs = [(name, ref.value) for name, ref in data.iterRefs(prefix="ref")]
+    else:
+        refs = [data.resolveRef(name) for name in refs]
+        refs = [(name, data.getRef(name).value) for name in refs]
+    refs = [(name, oid) for name, oid in refs if oid]
+
+    marks = {}
+
+    def markOf(oid):
+        if oid not in marks:
+            marks[oid] = len(marks) + 1
+        return marks[oid]
+
+    for oid in _topologicalOrder([oid for _, oid in refs]):
+        commit = data.getCommit(oid)
+        parentTree = None
+        if commit["parents"]:
+            parentTree = data.getCommit(commit["parents"][0])["tree"]
+
+        changes = list(base.iterTreeChanges(parentTree, commit["tree"]))
+        for path, blobId in changes:
+            if blobId and blobId not in marks:
+                out.write(f"blob\nmark :{markOf(blobId)}\n".encode())
+                _writeData(out, data.getObject(blobId))
+                out.write(b"\n")
+
+        out.write(f"commit\nmark :{markOf(oid)}\n".encode())
+        _writeData(out, commit["message"].encode())
+        for i, parent in enumerate(commit["parents"]):
+            command = "from" if i == 0 else "merge"
+            out.write(f"{command} :{marks[parent]}\n".encode())
+        for path, blobId in changes:
+            if "\n" in path:
+                raise ValueError(f"Can't export a path containing a newline: {path!r}")
+            if blobId:
+                out.write(f"M {BLOB_MODE} :{marks[blobId]} {path}\n".encode())
+            else:
+                out.write(f"D {path}\n".encode())
+        out.write(b"\n")
+
+    for name, oid in refs:
+        out.write(f"reset {name}\nfrom :{marks[oid]}\n\n".encode())
+
+
+class _Reader:
+    '''
+    Reads the commands of an import stream line by line.
+    '''
+    def __init__(self, inp):
+        self._inp = inp
+        self._pending = None
+
+    def readLine(self):
+        if self._pending is not None:
+            line, self._pending = self._pending, None
+            return line
+        line = self._inp.readline()
+        if not line:
+            return None
+        return line.rstrip(b"\n").decode()
+
+    def unreadLine(self, line):
+        self._pending = line
+
+    def readData(self):
+        line = self.readLine()
+        if line is None or not line.startswith("data "):
+            raise ValueError(f"Expected a data command, got: {line!r}")
+        size = int(line[len("data "):])
+        content = self._inp.read(size)
+        if len(content) != size:
+            raise ValueError("Unexpected end of the stream inside a data command.")
+        # The line feed ending the data is optional
+        line = self.readLine()
+        if line:
+            self.unreadLine(line)
+        return content
+
+
+class _Importer:
+    '''
+    Applies the commands of an import stream to the object database.
+    '''
+    def __init__(self, reader):
+        self.reader = reader
+        self.marks = {}
+        self.refs = []
+        self.commits = 0
+
+    def resolve(self, name):
+        if name.startswith(":"):
+            return self.marks[int(name[1:])]
+        return name
+
+    def apply(self, line):
+        '''
+        Applies the command starting with the given line and
+        returns the number of objects written.
+        '''
+        reader = self.reader
+        if line == "":
+            return 0
+
+        if line == "blob":
+            mark = _readMark(reader)
+            oid = data.hashObject(reader.readData())
+            if mark is not None:
+                self.marks[mark] = oid
+            return 1
+
+        if line == "commit":
+            mark = _readMark(reader)
+            message = reader.readData().decode()
+            parents = []
+            builder = TreeBuilder()
+            while True:
+                line = reader.readLine()
+                if not line:
+                    break
+                command, _, argument = line.partition(" ")
+                if command in ("from", "merge"):
+                    parent = self.resolve(argument)
+                    if not parents:
+                        # Changes apply on top of the first parent's tree
+                        builder = TreeBuilder(data.getCommit(parent)["tree"])
+                    parents.append(parent)
+                elif command == "M":
+                    _, oid, path = argument.split(" ", 2)
+                    builder.setBlob(path, self.resolve(oid))
+                elif command == "D":
+                    builder.remove(argument)
+                else:
+                    raise ValueError(f"Unknown commit command: {line!r}")
+
+            oid = base.writeCommit(builder.write(), parents, message)
+            if mark is not None:
+                self.marks[mark] = oid
+            self.commits += 1
+            return 2
+
+        if line.startswith("reset "):
+            name = line[len("reset "):]
+            line = reader.readLine()
+            if line and line.startswith("from "):
+                self.refs.append((name, self.resolve(line[len("from "):])))
+            else:
+                reader.unreadLine(line)
+            return 0
+
+        raise ValueError(f"Unknown command: {line!r}")
+
+
+@data.mgit_required
+def importHistory(inp):
+    '''
+    Reads a stream written by exportHistory from the binary stream inp
+    and writes its blobs, trees and commits straight to the object
+    database, then updates the references. The working directory is
+    never touched. Objects are written in batches of BATCH_SIZE.
+    Returns the number of commits imported.
+    '''
+    reader = _Reader(inp)
+    importer = _Importer(reader)
+
+    finished = False
+    while not finished:
+        with data.objectBatch():
+            written = 0
+            while written < BATCH_SIZE:
+                line = reader.readLine()
+                if line is None:
+                    finished = True
+                    break
+                written += importer.apply(line)
+
+    # References are updated once all the objects are in place
+    for name, oid in importer.refs:
+        data.updateRef(name, data.RefValue(symbolic=False, value=oid), deref=False)
+
+    return importer.commits
+
+
+def _readMark(reader):
+    line = reader.readLine()
+    if line is not None and line.startswith("mark :"):
+        return int(line[len("mark :"):])
+    reader.unreadLine(line)
+    return None
@@ -0,0 +1,133 @@
+import data
+
+
+class _Node:
+    '''
+    A directory of a TreeBuilder. The entries of a node are only
+    loaded from its tree object once the node is changed.
+    '''
+    def __init__(self, repository, oid = None):
+        self.repository = repository
+        self.oid = oid
+        # name -> (type, object-id) or name -> _Node for the
+        # directories being changed
+        self.entries = None
+        self.dirty = False
+
+    def load(self):
+        if self.entries is None:
+            self.entries = {}
+            if self.oid:
+                for type_, oid, name in data.iterTreeEntries(self.repository.getObject(self.oid, "tree")):
+                    self.entries[name] = (type_, oid)
+        return self.entries
+
+
+class TreeBuilder:
+    '''
+    Applies path -> blob updates on top of an existing tree object,
+    without going through the working directory.
+    Only the trees along the changed paths are loaded and rewritten,
+    every other subtree keeps its object-id.
+    By default, objects are read from and written to the current
+    repository.
+    '''
+    def __init__(self, treeId = None, repository = None):
+        self.repository = repository or data.current()
+        self._root = _Node(self.repository, treeId)
+
+    def _walk(self, path, create):
+        '''
+        Returns the nodes of the directories down to the one containing
+        the given path, along with the name of the entry. Returns
+        (None, name) if a directory is missing and create isn't set.
+        '''
+        *directories, name = _splitPath(path)
+        node = self._root
+        spine = [node]
+        for directory in directories:
+            entries = node.load()
+            child = entries.get(directory)
+            if isinstance(child, _Node):
+                node = child
+            elif child is not None and child[0] == "tree":
+                node = entries[directory] = _Node(self.repository, child[1])
+            elif create:
+                # A missing directory, or a file replaced by a directory
+                node = entries[directory] = _Node(self.repository)
+            else:
+                return None, name
+            spine.append(node)
+
+        node.load()
+        return spine, name
+
+    def addBlob(self, path, content):
+        '''
+        Writes a blob with the given content and sets it at the path.
+        Returns the object-id of the blob.
+        '''
+        oid = self.repository.hashObject(content)
+        self.setBlob(path, oid)
+        return oid
+
+    def setBlob(self, path, oid):
+        '''
+        Sets the file at the path to the blob with the given object-id.
+        '''
+        spine, name = self._walk(path, create=True)
+        spine[-1].entries[name] = ("blob", oid)
+        _markDirty(spine)
+
+    def remove(self, path):
+        '''
+        Removes the file or directory at the path, if there is one.
+        '''
+        spine, name = self._walk(path, create=False)
+        if spine is None or spine[-1].entries.pop(name, None) is None:
+            return
+        _markDirty(spine)
+
+        # Directories left empty are removed as well, as an
+        # empty tree can't be checked out or exported
+        names = _splitPath(path)[:-1]
+        for node, parent, directory in zip(reversed(spine[1:]), reversed(spine[:-1]),
+                                           reversed(names)):
+            if node.entries:
+                break
+            del parent.entries[directory]
+
+    def write(self):
+        '''
+        Writes the changed trees and returns the object-id
+        of the root tree.
+        '''
+        return _writeNode(self._root)
+
+
+def _markDirty(spine):
+    for node in spine:
+        node.dirty = True
+
+
+def _writeNode(node):
+    if not node.dirty and node.oid:
+        return node.oid
+
+    entries = []
+    for name, entry in node.load().items():
+        if isinstance(entry, _Node):
+            entries.append(("tree", _writeNode(entry), name))
+        else:
+            entries.append((entry[0], entry[1], name))
+
+    node.oid = node.repository.hashObject(data.encodeTree(entries), "tree")
+    node.dirty = False
+    return node.oid
+
+
+def _splitPath(path):
+    names = [name for name in path.split("/") if name and name != "."]
+    if not names or ".." in names:
+        raise ValueError(f"Invalid path: {path!r}")
+    return names
@@ -0,0 +1,105 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import data
+
+# Upper bound on the number of threads writing files
+MAX_WORKERS = 32
+# Number of files written between two progress reports
+PROGRESS_INTERVAL = 256
+
+
+def planTree(objectId, basePath = "", repository = None):
+    '''
+    Returns the directories and the (path, object-id) files
+    that make up the given tree object.
+    Directories are listed parents first, so that creating them
+    in order builds the skeleton of the tree.
+    By default, objects are read from the current repository.
+    '''
+    repository = repository or data.current()
+    directories = []
+    files = []
+    trees = [(objectId, basePath)]
+
+    while trees:
+        treeId, path = trees.pop()
+        for type_, oid, name in data.iterTreeEntries(repository.getObject(treeId, "tree")):
+            assert "/" not in name
+            assert name not in ("..", ".")
+            entryPath = os.path.join(path, name)
+            if type_ == "blob":
+                files.append((entryPath, oid))
+            elif type_ == "tree":
+                directories.append(entryPath)
+                trees.append((oid, entryPath))
+            else:
+                assert False, f"Unknown tree entry {type_}"
+
+    return directories, files
+
+
+def planFiles(files):
+    '''
+    Returns the directories and the (path, object-id) files for
+    a mapping of file paths to object-ids.
+    '''
+    directories = set()
+    for path in files:
+        parent = os.path.dirname(path)
+        while parent and parent not in directories:
+            directories.add(parent)
+            parent = os.path.dirname(parent)
+
+    return sorted(directories), list(files.items())
+
+
+def _writeFile(repository, basePath, path, oid):
+    with open(os.path.join(basePath, path), "wb") as file:
+        for chunk in repository.streamObject(oid, "blob"):
+            file.write(chunk)
+
+
+def reportProgress(done, total):
+    '''
+    Prints the checkout progress on a single line of stderr.
+    '''
+    percent = done * 100 // total if total else 100
+    end = "\n" if done == total else ""
+    print(f"\rChecking out files: {percent}% ({done}/{total})",
+          end=end, file=sys.stderr, flush=True)
+
+
+def checkout(directories, files, basePath = ".", workers = None, progress = None,
+             repository = None):
+    '''
+    Writes the given files(as planned by planTree or planFiles)
+    under basePath.
+    The directory skeleton is created first, the blobs are then
+    streamed from the object database into their files on a
+    bounded thread pool. progress is called with the number of
+    files written and the total every PROGRESS_INTERVAL files
+    and once all of them are written.
+    By default, objects are read from the current repository.
+    '''
+    repository = repository or data.current()
+    for directory in directories:
+        os.makedirs(os.path.join(basePath, directory), exist_ok=True)
+
+    total = len(files)
+    if progress:
+        progress(0, total)
+    if not files:
+        return
+
+    if workers is None:
+        workers = min(MAX_WORKERS, (os.cpu_count() or 1) * 4)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(_writeFile, repository, basePath, path, oid)
+                   for path, oid in files]
+        for done, future in enumerate(as_completed(futures), 1):
+            # Re-raises any error hit while writing the file
+            future.result()
+            if progress and (done % PROGRESS_INTERVAL == 0 or done == total):
+                progress(done, total)